@@ -0,0 +1,188 @@
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class MemoryBucketStore:
+    """Token buckets kept in this process. Each worker enforces its own limits."""
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, capacity):
+        """Take one token from ``key``'s bucket; return 0 or the seconds until one is available."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated_at) * rate)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                return (1 - tokens) / rate
+            self._buckets[key] = (tokens - 1, now)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now, rate, capacity)
+            return 0
+
+    def refund(self, key, capacity):
+        """Give back a token taken for a request that was then turned away."""
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                self._buckets[key] = (min(capacity, bucket[0] + 1), bucket[1])
+
+    def _prune(self, now, rate, capacity):
+        # A bucket that has refilled completely carries no state worth keeping.
+        full_after = capacity / rate
+        for key, (tokens, updated_at) in list(self._buckets.items()):
+            if now - updated_at >= full_after:
+                del self._buckets[key]
+
+
+class RedisBucketStore:
+    """Token buckets shared by every worker through Redis (requires the ``redis`` package)."""
+
+    SCRIPT = '''
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens < 1 then
+    wait = (1 - tokens) / rate
+else
+    tokens = tokens - 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+'''
+
+    REFUND_SCRIPT = '''
+local tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens'))
+if tokens then
+    redis.call('HSET', KEYS[1], 'tokens', math.min(tonumber(ARGV[1]), tokens + 1))
+end
+'''
+
+    def __init__(self, url, prefix='admission:'):
+        import redis  # optional dependency, only needed for shared limits
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._script = self.client.register_script(self.SCRIPT)
+        self._refund = self.client.register_script(self.REFUND_SCRIPT)
+
+    def take(self, key, rate, capacity):
+        return float(self._script(keys=[f'{self.prefix}{key}'], args=[rate, capacity, time.time()]))
+
+    def refund(self, key, capacity):
+        self._refund(keys=[f'{self.prefix}{key}'], args=[capacity])
+
+
+class AdmissionController:
+    """Per-key token buckets in front of a global cap on concurrent work.
+
+    Callers over their rate, or arriving when ``max_queue`` others are already
+    waiting for a slot, are rejected immediately. Everyone else waits up to
+    ``max_wait`` seconds for one of the ``max_concurrent`` slots.
+    """
+
+    def __init__(self, rate_per_minute, burst, max_concurrent, max_wait, max_queue, store=None):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.max_concurrent = max_concurrent
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.store = store or MemoryBucketStore()
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._in_flight = 0
+        self._avg_duration = max_wait
+
+    @classmethod
+    def from_config(cls, config, prefix):
+        redis_url = config.get('ADMISSION_REDIS_URL')
+        return cls(
+            rate_per_minute=config.get(f'{prefix}_RATE_PER_MINUTE', 4),
+            burst=config.get(f'{prefix}_BURST', 3),
+            max_concurrent=config.get(f'{prefix}_MAX_CONCURRENT', 4),
+            max_wait=config.get(f'{prefix}_MAX_WAIT', 10.0),
+            max_queue=config.get(f'{prefix}_MAX_QUEUE', 16),
+            store=RedisBucketStore(redis_url, prefix=f'{prefix.lower()}:') if redis_url else None,
+        )
+
+    def acquire(self, key):
+        """Take a slot for ``key`` and return the function that gives it back.
+
+        For work that outlives the caller, e.g. a provider call still running
+        after its deadline; the release function may be called from any thread,
+        and only its first call counts.
+        """
+        # A request turned away for overload must not use up the caller's rate:
+        # the queue is checked before a token is taken, and a timed-out wait
+        # gives its token back.
+        with self._lock:
+            if self._waiting >= self.max_queue:
+                raise AdmissionRejected('too many requests queued', self._avg_duration)
+            self._waiting += 1
+        try:
+            wait = self.store.take(key, self.rate, self.burst)
+            if wait > 0:
+                raise AdmissionRejected('rate limit exceeded', wait)
+            acquired = self._slots.acquire(timeout=self.max_wait)
+        finally:
+            with self._lock:
+                self._waiting -= 1
+        if not acquired:
+            self.store.refund(key, self.burst)
+            raise AdmissionRejected('timed out waiting for a free slot', self._avg_duration)
+
+        with self._lock:
+            self._in_flight += 1
+        started = time.monotonic()
+        released = False
+
+        def release():
+            nonlocal released
+            with self._lock:
+                if released:
+                    return
+                released = True
+                self._in_flight -= 1
+                self._avg_duration = 0.8 * self._avg_duration + 0.2 * (time.monotonic() - started)
+            self._slots.release()
+        return release
+
+    @contextmanager
+    def admit(self, key):
+        release = self.acquire(key)
+        try:
+            yield
+        finally:
+            release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': self._in_flight,
+                'waiting': self._waiting,
+                'max_concurrent': self.max_concurrent,
+                'avg_duration': round(self._avg_duration, 3),
+            }
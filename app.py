@@ -1,28 +1,64 @@
 import os
-from flask import Flask, request, render_template_string, redirect, url_for, g, jsonify
+from flask import Flask, request, render_template, redirect, url_for, g, jsonify
+from jinja2 import ChoiceLoader, DictLoader
 from dotenv import load_dotenv
 import sqlite3
-from flask_socketio import SocketIO, emit
+from flask_socketio import SocketIO, emit, join_room, leave_room
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
-from datetime import datetime
+from datetime import datetime, timedelta
+from functools import partial, wraps
+from collections import Counter, defaultdict, namedtuple
+import threading
 import requests
 import base64
+import hmac
+import json
 import logging
+import time
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from sqlalchemy.exc import IntegrityError, OperationalError, ProgrammingError
+from admission import AdmissionController, AdmissionRejected
+from image_providers import ImageGenerator, LateImage, StabilityProvider, is_procedural
+from assets import init_assets
+from session_store import init_sessions
+from profiling import init_profiling
+from log_utils import configure_logging, Truncated
 
 # Set up logging
-logging.basicConfig(level=logging.DEBUG)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
-app.config['SECRET_KEY'] = 'your_secret_key_here'
+app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY')
+app.config['SECRET_KEY_FALLBACKS'] = [key.strip() for key in os.environ.get('SECRET_KEY_FALLBACKS', '').split(',') if key.strip()]
+app.config['SESSION_BACKEND'] = os.environ.get('SESSION_BACKEND', 'cookie')
+app.config['SESSION_FILE_DIR'] = os.environ.get('SESSION_FILE_DIR')
 app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['IMAGE_GENERATION_RATE_PER_MINUTE'] = float(os.environ.get('IMAGE_GENERATION_RATE_PER_MINUTE', 4))
+app.config['IMAGE_GENERATION_BURST'] = int(os.environ.get('IMAGE_GENERATION_BURST', 3))
+app.config['IMAGE_GENERATION_MAX_CONCURRENT'] = int(os.environ.get('IMAGE_GENERATION_MAX_CONCURRENT', 4))
+app.config['IMAGE_GENERATION_MAX_WAIT'] = float(os.environ.get('IMAGE_GENERATION_MAX_WAIT', 10))
+app.config['IMAGE_GENERATION_MAX_QUEUE'] = int(os.environ.get('IMAGE_GENERATION_MAX_QUEUE', 16))
+app.config['ADMISSION_REDIS_URL'] = os.environ.get('ADMISSION_REDIS_URL')
+# Seconds to wait for the image provider before posting with a procedural bee;
+# the real image replaces it when it arrives.
+app.config['IMAGE_PROVIDER_DEADLINE'] = float(os.environ.get('IMAGE_PROVIDER_DEADLINE', 8))
+app.config['IMAGE_PROVIDER_WORKERS'] = int(os.environ.get('IMAGE_PROVIDER_WORKERS', 4))
+# Seconds before a Stability call is abandoned, freeing its worker and admission slot.
+app.config['STABILITY_TIMEOUT'] = float(os.environ.get('STABILITY_TIMEOUT', 60))
+app.config['PROFILE_TOKEN'] = os.environ.get('PROFILE_TOKEN')
+# Required as X-Stats-Token by /socket_stats and /image_provider_stats; unset, they are disabled.
+app.config['STATS_TOKEN'] = os.environ.get('STATS_TOKEN')
+app.config['PROFILE_SAMPLE_RATE'] = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+app.config['PROFILE_INTERVAL_MS'] = float(os.environ.get('PROFILE_INTERVAL_MS', 5))
+app.config['PROFILE_DIR'] = os.environ.get('PROFILE_DIR')
+app.config['SLOW_REQUEST_MS'] = float(os.environ.get('SLOW_REQUEST_MS', 1000))
 
 db = SQLAlchemy(app)
 migrate = Migrate(app, db)
@@ -30,6 +66,39 @@ migrate = Migrate(app, db)
 login_manager = LoginManager(app)
 login_manager.login_view = 'login'
 socketio = SocketIO(app)
+init_assets(app)
+init_sessions(app)
+init_profiling(app)
+image_admission = AdmissionController.from_config(app.config, 'IMAGE_GENERATION')
+PROFILE_PAGE_SIZE = int(os.environ.get('PROFILE_PAGE_SIZE', 20))
+STABILITY_CONNECTIVITY_TIMEOUT = 5
+
+# Hot page: messages, comments and reactions add time-decayed weight to the
+# message's score (see ranking.py for the scheme); scores are rescaled every
+# HOT_RENORMALIZE_INTERVAL seconds so they never overflow.
+HOT_HALF_LIFE_SECONDS = float(os.environ.get('HOT_HALF_LIFE_HOURS', 12)) * 3600
+HOT_RENORMALIZE_INTERVAL = float(os.environ.get('HOT_RENORMALIZE_INTERVAL', 3600))
+HOT_PAGE_SIZE = int(os.environ.get('HOT_PAGE_SIZE', 50))
+ENGAGEMENT_WEIGHTS = {'message': 1.0, 'comment': 2.0, 'reaction': 1.0}
+
+# Socket.IO events are written to the outbox in the transaction that causes
+# them and emitted, in id order, by a background dispatcher.
+OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', 100))
+OUTBOX_POLL_INTERVAL = float(os.environ.get('OUTBOX_POLL_INTERVAL', 1))
+# How long a gap in event ids may be an uncommitted transaction rather than a rollback.
+OUTBOX_GAP_GRACE_SECONDS = float(os.environ.get('OUTBOX_GAP_GRACE_SECONDS', 5))
+OUTBOX_RETENTION_SECONDS = float(os.environ.get('OUTBOX_RETENTION_SECONDS', 24 * 3600))
+OUTBOX_CATCH_UP_LIMIT = 500
+
+# Clients join one room per message they have on screen; comment and reaction
+# updates go only to that room.
+MAX_SUBSCRIPTIONS_PER_CLIENT = 200
+subscriptions = {}
+room_members = Counter()
+subscriptions_lock = threading.Lock()
+
+def message_room(message_id):
+    return f'message:{message_id}'
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -43,6 +112,7 @@ class Message(db.Model):
     content = db.Column(db.Text, nullable=False)
     image_data = db.Column(db.Text)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (db.Index('ix_message_user_id_timestamp', 'user_id', 'timestamp'),)
 
 class Comment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -58,12 +128,221 @@ class Reaction(db.Model):
     reaction = db.Column(db.String(10), nullable=False)
     __table_args__ = (db.UniqueConstraint('message_id', 'user_id', 'reaction'),)
 
+class MessageScore(db.Model):
+    message_id = db.Column(db.Integer, db.ForeignKey('message.id'), primary_key=True)
+    score = db.Column(db.Float, nullable=False, default=0.0, index=True)
+
+class HotEpoch(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    started_at = db.Column(db.DateTime, nullable=False)
+
+class OutboxEvent(db.Model):
+    __table_args__ = {'sqlite_autoincrement': True}  # never reuse the id of a pruned event
+    id = db.Column(db.Integer, primary_key=True)
+    event = db.Column(db.String(40), nullable=False)
+    room = db.Column(db.String(80))
+    payload = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+class OutboxCursor(db.Model):
+    # Id of the last event the dispatcher emitted; clients catch up to it.
+    name = db.Column(db.String(40), primary_key=True)
+    last_id = db.Column(db.Integer, nullable=False, default=0)
+
+# List pages read these projections rather than Message/User instances: only the
+# columns the templates show, with the base64 image left in the table and served
+# by /message/<id>/image.
+AuthorRow = namedtuple('AuthorRow', 'username avatar')
+ReactionCount = namedtuple('ReactionCount', 'reaction count')
+
+class CommentRow:
+    __slots__ = ('content', 'timestamp', 'user')
+
+    def __init__(self, content, timestamp, user):
+        self.content = content
+        self.timestamp = timestamp
+        self.user = user
+
+class MessageRow:
+    __slots__ = ('id', 'content', 'timestamp', 'has_image', 'user', 'reactions', 'comments')
+
+    def __init__(self, id, content, timestamp, has_image, user):
+        self.id = id
+        self.content = content
+        self.timestamp = timestamp
+        self.has_image = has_image
+        self.user = user
+        self.reactions = ()
+        self.comments = ()
+
+def message_rows_query():
+    return (db.select(Message.id, Message.content, Message.timestamp,
+                      Message.image_data.is_not(None).label('has_image'),
+                      User.username, User.avatar)
+            .join(User, User.id == Message.user_id))
+
+def message_rows(query, details=True):
+    messages = [MessageRow(id, content, timestamp, has_image, AuthorRow(username, avatar))
+                for id, content, timestamp, has_image, username, avatar in db.session.execute(query)]
+    if not details or not messages:
+        return messages
+    ids = [message.id for message in messages]
+    reactions = defaultdict(list)
+    for message_id, reaction, count in db.session.execute(
+            db.select(Reaction.message_id, Reaction.reaction, db.func.count(Reaction.id))
+            .where(Reaction.message_id.in_(ids))
+            .group_by(Reaction.message_id, Reaction.reaction)):
+        reactions[message_id].append(ReactionCount(reaction, count))
+    comments = defaultdict(list)
+    for message_id, content, timestamp, username, avatar in db.session.execute(
+            db.select(Comment.message_id, Comment.content, Comment.timestamp, User.username, User.avatar)
+            .join(User, User.id == Comment.user_id)
+            .where(Comment.message_id.in_(ids))
+            .order_by(Comment.timestamp, Comment.id)):
+        comments[message_id].append(CommentRow(content, timestamp, AuthorRow(username, avatar)))
+    for message in messages:
+        message.reactions = reactions.get(message.id, ())
+        message.comments = comments.get(message.id, ())
+    return messages
+
+HOT_EPOCH_ID = 1
+hot_renormalizer_lock = threading.Lock()
+hot_renormalizer_started = False
+
+def hot_epoch():
+    # A shared lock, so renormalize_hot can't rescale between this read and the
+    # score written with it (the row itself is created by ensure_schema).
+    return db.session.execute(
+        db.select(HotEpoch.started_at).where(HotEpoch.id == HOT_EPOCH_ID).with_for_update(read=True)).scalar_one()
+
+def record_engagement(message_id, kind, at=None, sign=1):
+    """Add (or, with ``sign=-1``, take back) one ``kind`` engagement in the current transaction."""
+    ensure_hot_renormalizer()
+    at = at or datetime.utcnow()
+    delta = sign * ENGAGEMENT_WEIGHTS[kind] * 2 ** ((at - hot_epoch()).total_seconds() / HOT_HALF_LIFE_SECONDS)
+    new_score = MessageScore.score + delta
+    updated = db.session.execute(
+        db.update(MessageScore).where(MessageScore.message_id == message_id)
+        .values(score=db.case((new_score > 0, new_score), else_=0.0))).rowcount
+    if not updated and delta > 0:
+        db.session.add(MessageScore(message_id=message_id, score=delta))
+
+def renormalize_hot(prune_below=1e-4):
+    now = datetime.utcnow()
+    epoch = db.session.execute(
+        db.select(HotEpoch).where(HotEpoch.id == HOT_EPOCH_ID).with_for_update()).scalar_one_or_none()
+    if epoch is None:
+        return
+    factor = 2 ** (-(now - epoch.started_at).total_seconds() / HOT_HALF_LIFE_SECONDS)
+    db.session.execute(db.update(MessageScore).values(score=MessageScore.score * factor))
+    db.session.execute(db.delete(MessageScore).where(MessageScore.score < prune_below))
+    epoch.started_at = now
+    db.session.commit()
+
+def ensure_hot_renormalizer():
+    global hot_renormalizer_started
+    with hot_renormalizer_lock:
+        if not hot_renormalizer_started and HOT_RENORMALIZE_INTERVAL:
+            socketio.start_background_task(run_hot_renormalizer)
+            hot_renormalizer_started = True
+
+def run_hot_renormalizer():
+    while True:
+        with app.app_context():
+            try:
+                renormalize_hot()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Hot score renormalization failed: {str(e)}")
+        socketio.sleep(HOT_RENORMALIZE_INTERVAL)
+
+OUTBOX_CURSOR = 'socketio'
+outbox_ready = False  # set once ensure_schema has the outbox tables
+outbox_wakeup = threading.Event()
+outbox_dispatcher_lock = threading.Lock()
+outbox_dispatcher_started = False
+
+def enqueue_event(event, payload, room=None):
+    """Add a Socket.IO event to the current transaction; it is emitted after commit."""
+    db.session.add(OutboxEvent(event=event, room=room, payload=json.dumps(payload)))
+
+def wake_outbox_dispatcher():
+    ensure_outbox_dispatcher()
+    outbox_wakeup.set()
+
+def ensure_outbox_dispatcher():
+    global outbox_dispatcher_started
+    with outbox_dispatcher_lock:
+        if not outbox_dispatcher_started:
+            socketio.start_background_task(run_outbox_dispatcher)
+            outbox_dispatcher_started = True
+
+def dispatched_cursor():
+    """The id of the last event emitted, or 0 while there is no outbox to read."""
+    if not outbox_ready:
+        return 0
+    try:
+        cursor = db.session.get(OutboxCursor, OUTBOX_CURSOR)
+    except (OperationalError, ProgrammingError) as e:
+        logger.warning(f"Could not read the outbox cursor: {str(e)}")
+        return 0
+    return cursor.last_id if cursor else 0
+
+def dispatch_outbox_batch():
+    """Emit the next batch of outbox events in order; returns how many were emitted."""
+    cursor = db.session.execute(
+        db.select(OutboxCursor).where(OutboxCursor.name == OUTBOX_CURSOR).with_for_update()
+    ).scalar_one_or_none()
+    if cursor is None:
+        cursor = OutboxCursor(name=OUTBOX_CURSOR, last_id=0)
+        db.session.add(cursor)
+    events = db.session.scalars(
+        db.select(OutboxEvent).where(OutboxEvent.id > cursor.last_id).order_by(OutboxEvent.id).limit(OUTBOX_BATCH_SIZE)
+    ).all()
+    emitted = 0
+    for event in events:
+        # Ids are assigned before commit, so a gap may be a transaction that has
+        # not committed yet. Wait for it a little; after that it was rolled back.
+        if event.id != cursor.last_id + 1 and (datetime.utcnow() - event.created_at).total_seconds() < OUTBOX_GAP_GRACE_SECONDS:
+            break
+        socketio.emit(event.event, dict(json.loads(event.payload), event_id=event.id), to=event.room)
+        cursor.last_id = event.id
+        emitted += 1
+    db.session.commit()
+    return emitted
+
+def prune_outbox():
+    cutoff = datetime.utcnow() - timedelta(seconds=OUTBOX_RETENTION_SECONDS)
+    # The newest event is always kept: on an empty table SQLite would hand out
+    # ids again from 1, at or below the cursor clients already hold.
+    newest = db.session.scalar(db.select(db.func.max(OutboxEvent.id))) or 0
+    db.session.execute(db.delete(OutboxEvent).where(OutboxEvent.created_at < cutoff,
+                                                     OutboxEvent.id <= dispatched_cursor(),
+                                                     OutboxEvent.id < newest))
+    db.session.commit()
+
+def run_outbox_dispatcher():
+    last_pruned = 0
+    while True:
+        outbox_wakeup.wait(OUTBOX_POLL_INTERVAL)
+        outbox_wakeup.clear()
+        with app.app_context():
+            try:
+                while dispatch_outbox_batch() == OUTBOX_BATCH_SIZE:
+                    pass
+                if time.monotonic() - last_pruned > 600:
+                    prune_outbox()
+                    last_pruned = time.monotonic()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Outbox dispatch failed: {str(e)}")
+
 @login_manager.user_loader
 def load_user(user_id):
     return User.query.get(int(user_id))
 
 def generate_dead_bee_image(prompt):
-    logger.debug(f"Generating dead bee image with prompt: {prompt}")
+    logger.debug("Generating dead bee image with prompt: %s", Truncated(prompt))
     api_key = os.getenv("STABILITY_API_KEY")
     logger.debug(f"API Key: {api_key[:5]}...{api_key[-5:]} (length: {len(api_key)})")
     if not api_key:
@@ -88,11 +367,12 @@ def generate_dead_bee_image(prompt):
         "samples": 1,
         "steps": 30,
     }
-    logger.debug(f"API Request Payload: {payload}")
+    logger.debug("API Request Payload: %s", Truncated(payload))
 
     try:
         try:
-            test_response = requests.get("https://api.stability.ai/v1/engines/list", headers=headers)
+            test_response = requests.get("https://api.stability.ai/v1/engines/list", headers=headers,
+                                         timeout=STABILITY_CONNECTIVITY_TIMEOUT)
             logger.debug(f"API Connectivity Test: {test_response.status_code}")
             if test_response.status_code == 401:
                 logger.error("API Key is invalid or expired")
@@ -101,21 +381,20 @@ def generate_dead_bee_image(prompt):
             logger.error(f"API Connectivity Test Failed: {str(e)}")
 
         logger.debug("Sending request to Stability AI API")
-        response = requests.post(url, headers=headers, json=payload)
+        response = requests.post(url, headers=headers, json=payload, timeout=app.config['STABILITY_TIMEOUT'])
         logger.debug(f"API Response Status: {response.status_code}")
         logger.debug(f"API Response Headers: {response.headers}")
-        logger.debug(f"API Response Content: {response.text[:1000]}...")
 
         response.raise_for_status()
         data = response.json()
-        logger.debug(f"API Response JSON: {data}")
+        logger.debug("API Response JSON: %s", Truncated(data))
 
         image_data = data["artifacts"][0]["base64"]
         logger.debug(f"Successfully generated image. Image data length: {len(image_data)}")
         return image_data, None
     except requests.exceptions.RequestException as e:
         logger.error(f"API Request Exception: {str(e)}")
-        logger.error(f"API Error Response: {e.response.text if e.response else 'No response'}")
+        logger.error("API Error Response: %s", Truncated(e.response.content) if e.response is not None else 'No response')
         return None, f"API error: {str(e)}"
     except KeyError as e:
         logger.error(f"KeyError while parsing API response: {str(e)}")
@@ -124,11 +403,41 @@ def generate_dead_bee_image(prompt):
         logger.error(f"Unexpected error in generate_dead_bee_image: {str(e)}")
         return None, f"Unexpected error: {str(e)}"
 
+image_generator = ImageGenerator.from_config(app.config, StabilityProvider(generate_dead_bee_image))
+
 @app.route('/')
 def index():
     logger.debug("Accessing index route")
-    messages = Message.query.order_by(Message.timestamp.desc()).all()
-    return render_template_string(BASE_HTML, messages=messages)
+    messages = message_rows(message_rows_query().order_by(Message.timestamp.desc()))
+    return render_template('app/index.html', messages=messages, event_cursor=dispatched_cursor())
+
+@app.route('/hot')
+def hot():
+    messages = message_rows(message_rows_query()
+                            .join(MessageScore, MessageScore.message_id == Message.id)
+                            .order_by(MessageScore.score.desc())
+                            .limit(HOT_PAGE_SIZE))
+    return render_template('app/index.html', messages=messages, event_cursor=dispatched_cursor())
+
+@app.route('/message/<int:message_id>/image')
+def message_image(message_id):
+    image_data = db.session.scalar(db.select(Message.image_data).where(Message.id == message_id))
+    if not image_data:
+        return "Image not found", 404
+    try:
+        data = base64.b64decode(image_data, validate=True)
+    except ValueError:
+        return "Image not found", 404
+    response = app.make_response(data)
+    response.mimetype = 'image/png'
+    response.add_etag()
+    response.cache_control.public = True
+    if is_procedural(data):
+        # A stand-in until the provider's image is backfilled; revalidate each time.
+        response.cache_control.no_cache = True
+    else:
+        response.cache_control.max_age = 7 * 24 * 3600
+    return response.make_conditional(request)
 
 @app.route('/post_message', methods=['POST'])
 @login_required
@@ -138,27 +447,51 @@ def post_message():
     
     if content:
         logger.debug(f"Generating image for message: {content}")
-        image_data, error = generate_dead_bee_image(content)
-        if error:
-            logger.error(f"Error generating image: {error}")
-            return f"Error generating image: {error}", 500
-
-        new_message = Message(user_id=current_user.id, content=content, image_data=image_data)
+        late_image = LateImage()
+        try:
+            release_slot = image_admission.acquire(current_user.id)
+        except AdmissionRejected as e:
+            logger.warning(f"Image generation rejected for user {current_user.id}: {e.reason}")
+            return f"Too many image requests ({e.reason}), try again later", 429, {'Retry-After': str(e.retry_after)}
+        # The slot is held until the provider call itself finishes, even past the deadline.
+        try:
+            result = image_generator.generate(content, on_late_image=late_image.deliver, on_done=release_slot)
+        except BaseException:
+            release_slot()
+            raise
+        if result.image_data is None:
+            logger.error("No image provider produced an image; posting without one")
+
+        new_message = Message(user_id=current_user.id, content=content, image_data=result.image_data)
         db.session.add(new_message)
-        db.session.commit()
-        
-        logger.debug(f"New message posted with ID: {new_message.id}")
-        socketio.emit('new_message', {
+        db.session.flush()
+        record_engagement(new_message.id, 'message', new_message.timestamp)
+        enqueue_event('new_message', {
             'id': new_message.id,
             'content': new_message.content,
-            'image_data': new_message.image_data,
+            'image_url': url_for('message_image', message_id=new_message.id) if result.image_data else None,
             'timestamp': new_message.timestamp.isoformat(),
             'username': current_user.username,
             'avatar': current_user.avatar,
             'reactions': {}
         })
+        db.session.commit()
+        wake_outbox_dispatcher()
+        if result.pending:
+            late_image.claim(partial(backfill_image, new_message.id))
+        
+        logger.debug(f"New message posted with ID: {new_message.id} (image from {result.provider})")
     return redirect(url_for('index'))
 
+def backfill_image(message_id, image_data):
+    """Replace ``message_id``'s procedural stand-in with the provider's late image."""
+    with app.app_context():
+        db.session.execute(db.update(Message).where(Message.id == message_id).values(image_data=image_data))
+        enqueue_event('image_update', {'message_id': message_id}, room=message_room(message_id))
+        db.session.commit()
+    wake_outbox_dispatcher()
+    logger.info(f"Backfilled image for message {message_id}")
+
 @app.route('/post_comment/<int:message_id>', methods=['POST'])
 @login_required
 def post_comment(message_id):
@@ -167,16 +500,19 @@ def post_comment(message_id):
     if content:
         new_comment = Comment(user_id=current_user.id, message_id=message_id, content=content)
         db.session.add(new_comment)
-        db.session.commit()
-        
-        logger.debug(f"New comment posted with ID: {new_comment.id}")
-        socketio.emit('new_comment', {
+        db.session.flush()
+        record_engagement(message_id, 'comment', new_comment.timestamp)
+        enqueue_event('new_comment', {
             'message_id': message_id,
             'content': new_comment.content,
             'timestamp': new_comment.timestamp.isoformat(),
             'username': current_user.username,
             'avatar': current_user.avatar
-        })
+        }, room=message_room(message_id))
+        db.session.commit()
+        wake_outbox_dispatcher()
+        
+        logger.debug(f"New comment posted with ID: {new_comment.id}")
     return redirect(url_for('index'))
 
 @app.route('/login', methods=['GET', 'POST'])
@@ -192,7 +528,7 @@ def login():
             return redirect(url_for('index'))
         logger.warning(f"Failed login attempt for user: {username}")
         return "Invalid username or password"
-    return render_template_string(LOGIN_HTML)
+    return render_template('app/login.html')
 
 @app.route('/register', methods=['GET', 'POST'])
 def register():
@@ -209,7 +545,7 @@ def register():
         db.session.commit()
         logger.debug(f"User {username} registered successfully")
         return redirect(url_for('login'))
-    return render_template_string(REGISTER_HTML)
+    return render_template('app/register.html')
 
 @app.route('/logout')
 @login_required
@@ -226,10 +562,25 @@ def profile(username):
         logger.warning(f"Profile not found for user: {username}")
         return "User not found", 404
     
-    messages = Message.query.filter_by(user_id=user.id).order_by(Message.timestamp.desc()).all()
+    query = message_rows_query().where(Message.user_id == user.id)
+    before = request.args.get('before')
+    before_id = request.args.get('before_id', type=int)
+    if before and before_id is not None:
+        try:
+            before = datetime.fromisoformat(before)
+        except ValueError:
+            return "Invalid cursor", 400
+        query = query.where(db.or_(Message.timestamp < before,
+                                    db.and_(Message.timestamp == before, Message.id < before_id)))
+    messages = message_rows(query.order_by(Message.timestamp.desc(), Message.id.desc()).limit(PROFILE_PAGE_SIZE + 1),
+                            details=False)
+    next_cursor = None
+    if len(messages) > PROFILE_PAGE_SIZE:
+        messages = messages[:PROFILE_PAGE_SIZE]
+        next_cursor = (messages[-1].timestamp, messages[-1].id)
     
     logger.debug(f"Rendering profile for user {username} with {len(messages)} messages")
-    return render_template_string(PROFILE_HTML, user=user, messages=messages)
+    return render_template('app/profile.html', user=user, messages=messages, next_cursor=next_cursor)
 
 @app.route('/add_reaction/<int:message_id>/<reaction>')
 @login_required
@@ -239,19 +590,25 @@ def add_reaction(message_id, reaction):
         existing_reaction = Reaction.query.filter_by(message_id=message_id, user_id=current_user.id, reaction=reaction).first()
         if existing_reaction:
             db.session.delete(existing_reaction)
+            # Reactions carry no timestamp, so this takes back today's weight: a
+            # quick toggle nets to zero, an old reaction costs a little more.
+            record_engagement(message_id, 'reaction', sign=-1)
         else:
             new_reaction = Reaction(message_id=message_id, user_id=current_user.id, reaction=reaction)
             db.session.add(new_reaction)
-        db.session.commit()
+            record_engagement(message_id, 'reaction')
+        db.session.flush()
         
         reactions = Reaction.query.filter_by(message_id=message_id).group_by(Reaction.reaction).with_entities(Reaction.reaction, db.func.count(Reaction.id)).all()
         reactions_dict = dict(reactions)
-        
-        logger.debug(f"Reaction added successfully. Current reactions: {reactions_dict}")
-        socketio.emit('reaction_update', {
+        enqueue_event('reaction_update', {
             'message_id': message_id,
             'reactions': reactions_dict
-        })
+        }, room=message_room(message_id))
+        db.session.commit()
+        wake_outbox_dispatcher()
+        
+        logger.debug(f"Reaction added successfully. Current reactions: {reactions_dict}")
         
         return 'OK', 200
     except Exception as e:
@@ -265,153 +622,15 @@ BASE_HTML = '''
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>Dead Bee Society</title>
-    <style>
-        body {
-            font-family: 'Arial', sans-serif;
-            background-color: #f0e68c;
-            color: #333;
-            margin: 0;
-            padding: 20px;
-        }
-        .container {
-            max-width: 800px;
-            margin: 0 auto;
-            background-color: #fff;
-            padding: 20px;
-            border-radius: 10px;
-            box-shadow: 0 0 10px rgba(0,0,0,0.1);
-        }
-        h1, h2 {
-            color: #8b4513;
-        }
-        .message {
-            border: 2px solid #deb887;
-            padding: 15px;
-            margin-bottom: 20px;
-            border-radius: 5px;
-        }
-        .message-content {
-            margin-bottom: 10px;
-        }
-        .message-meta {
-            font-size: 0.8em;
-            color: #777;
-        }
-        form {
-            margin-bottom: 20px;
-        }
-        input[type="text"], textarea {
-            width: 100%;
-            padding: 10px;
-            margin-bottom: 10px;
-            border: 1px solid #deb887;
-            border-radius: 5px;
-        }
-        input[type="submit"] {
-            background-color: #8b4513;
-            color: #fff;
-            border: none;
-            padding: 10px 20px;
-            cursor: pointer;
-            border-radius: 5px;
-        }
-        .nav {
-            margin-bottom: 20px;
-        }
-        .nav a {
-            color: #8b4513;
-            margin-right: 10px;
-            text-decoration: none;
-        }
-        .comments-section {
-            margin-top: 10px;
-            padding-top: 10px;
-            border-top: 1px solid #deb887;
-        }
-        .avatar {
-            font-size: 1.5em;
-            margin-right: 5px;
-        }
-        .dead-bee-image {
-            max-width: 100%;
-            height: auto;
-            margin-top: 10px;
-            border-radius: 5px;
-        }
-    </style>
-    <script src="https://cdnjs.cloudflare.com/ajax/libs/socket.io/4.0.1/socket.io.js"></script>
-    <script>
-        var socket = io();
-        
-        socket.on('new_message', function(message) {
-            console.log('New message received:', message);
-            var messagesContainer = document.querySelector('.container');
-            var newMessageElement = document.createElement('div');
-            newMessageElement.className = 'message';
-            newMessageElement.innerHTML = `
-                <div class="message-content">${message.content}</div>
-                <img src="data:image/png;base64,${message.image_data}" alt="Dead Bee" class="dead-bee-image">
-                <div class="message-meta">
-                    <span class="avatar">${message.avatar}</span>
-                    Posted by ${message.username} on ${message.timestamp}
-                </div>
-                <div class="comments-section"></div>
-                <form action="/post_comment/${message.id}" method="post">
-                    <input type="text" name="content" placeholder="Add a comment" required>
-                    <input type="submit" value="Post Comment">
-                </form>
-            `;
-            messagesContainer.insertBefore(newMessageElement, messagesContainer.firstChild);
-        });
-        
-        socket.on('new_comment', function(comment) {
-            console.log('New comment received:', comment);
-            var messageElement = document.querySelector(`[data-message-id="${comment.message_id}"]`);
-            if (messageElement) {
-                var commentsSection = messageElement.querySelector('.comments-section');
-                var newCommentElement = document.createElement('div');
-                newCommentElement.className = 'comment';
-                newCommentElement.innerHTML = `
-                    <div class="comment-content">${comment.content}</div>
-                    <div class="comment-meta">
-                        <span class="avatar">${comment.avatar}</span>
-                        Posted by ${comment.username} on ${comment.timestamp}
-                    </div>
-                `;
-                commentsSection.appendChild(newCommentElement);
-            }
-        });
-
-        socket.on('reaction_update', function(data) {
-            console.log('Reaction update received:', data);
-            var messageElement = document.querySelector(`[data-message-id="${data.message_id}"]`);
-            if (messageElement) {
-                var reactionsElement = messageElement.querySelector('.reactions');
-                if (reactionsElement) {
-                    reactionsElement.innerHTML = '';
-                    for (var reaction in data.reactions) {
-                        reactionsElement.innerHTML += `<button onclick="addReaction(${data.message_id}, '${reaction}')">${reaction} ${data.reactions[reaction]}</button>`;
-                    }
-                }
-            }
-        });
-
-        function addReaction(messageId, reaction) {
-            console.log('Adding reaction:', messageId, reaction);
-            fetch(`/add_reaction/${messageId}/${reaction}`, {method: 'GET'})
-                .then(response => {
-                    if (!response.ok) {
-                        throw new Error('Network response was not ok');
-                    }
-                })
-                .catch(error => console.error('Error:', error));
-        }
-    </script>
+    <link rel="stylesheet" href="{{ asset_url('css/app.css') }}">
+    <script src="https://cdnjs.cloudflare.com/ajax/libs/socket.io/4.0.1/socket.io.js" defer></script>
+    <script src="{{ asset_url('js/app.js') }}" defer></script>
 </head>
-<body>
+<body data-event-cursor="{{ event_cursor }}">
     <div class="container">
         <div class="nav">
             <a href="{{ url_for('index') }}">Home</a>
+            <a href="{{ url_for('hot') }}">Trending</a>
             {% if current_user.is_authenticated %}
                 <a href="{{ url_for('logout') }}">Logout</a>
                 <a href="{{ url_for('profile', username=current_user.username) }}">Profile</a>
@@ -430,7 +649,9 @@ BASE_HTML = '''
         {% for message in messages %}
             <div class="message" data-message-id="{{ message.id }}">
                 <div class="message-content">{{ message.content }}</div>
-                <img src="data:image/png;base64,{{ message.image_data }}" alt="Dead Bee" class="dead-bee-image">
+                {% if message.has_image %}
+                    <img src="{{ url_for('message_image', message_id=message.id) }}" alt="Dead Bee" class="dead-bee-image" loading="lazy">
+                {% endif %}
                 <div class="message-meta">
                     <span class="avatar">{{ message.user.avatar }}</span>
                     Posted by <a href="{{ url_for('profile', username=message.user.username) }}">{{ message.user.username }}</a> on {{ message.timestamp }}
@@ -474,47 +695,10 @@ LOGIN_HTML = '''
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>Login - Dead Bee Society</title>
-    <style>
-        body {
-            font-family: 'Arial', sans-serif;
-            background-color: #f0e68c;
-            color: #333;
-            margin: 0;
-            padding: 20px;
-        }
-        .container {
-            max-width: 400px;
-            margin: 0 auto;
-            background-color: #fff;
-            padding: 20px;
-            border-radius: 10px;
-            box-shadow: 0 0 10px rgba(0,0,0,0.1);
-        }
-        h1 {
-            color: #8b4513;
-        }
-        form {
-            margin-top: 20px;
-        }
-        input[type="text"], input[type="password"] {
-            width: 100%;
-            padding: 10px;
-            margin-bottom: 10px;
-            border: 1px solid #deb887;
-            border-radius: 5px;
-        }
-        input[type="submit"] {
-            background-color: #8b4513;
-            color: #fff;
-            border: none;
-            padding: 10px 20px;
-            cursor: pointer;
-            border-radius: 5px;
-        }
-    </style>
+    <link rel="stylesheet" href="{{ asset_url('css/app.css') }}">
 </head>
 <body>
-    <div class="container">
+    <div class="container container-narrow">
         <h1>Login</h1>
         <form action="{{ url_for('login') }}" method="post">
             <input type="text" name="username" placeholder="Username" required>
@@ -533,47 +717,10 @@ REGISTER_HTML = '''
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>Register - Dead Bee Society</title>
-    <style>
-        body {
-            font-family: 'Arial', sans-serif;
-            background-color: #f0e68c;
-            color: #333;
-            margin: 0;
-            padding: 20px;
-        }
-        .container {
-            max-width: 400px;
-            margin: 0 auto;
-            background-color: #fff;
-            padding: 20px;
-            border-radius: 10px;
-            box-shadow: 0 0 10px rgba(0,0,0,0.1);
-        }
-        h1 {
-            color: #8b4513;
-        }
-        form {
-            margin-top: 20px;
-        }
-        input[type="text"], input[type="password"], select {
-            width: 100%;
-            padding: 10px;
-            margin-bottom: 10px;
-            border: 1px solid #deb887;
-            border-radius: 5px;
-        }
-        input[type="submit"] {
-            background-color: #8b4513;
-            color: #fff;
-            border: none;
-            padding: 10px 20px;
-            cursor: pointer;
-            border-radius: 5px;
-        }
-    </style>
+    <link rel="stylesheet" href="{{ asset_url('css/app.css') }}">
 </head>
 <body>
-    <div class="container">
+    <div class="container container-narrow">
         <h1>Register</h1>
         <form action="{{ url_for('register') }}" method="post">
             <input type="text" name="username" placeholder="Username" required>
@@ -600,59 +747,9 @@ PROFILE_HTML = '''
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>{{ user.username }}'s Profile - Dead Bee Society</title>
-    <style>
-        body {
-            font-family: 'Arial', sans-serif;
-            background-color: #f0e68c;
-            color: #333;
-            margin: 0;
-            padding: 20px;
-        }
-        .container {
-            max-width: 800px;
-            margin: 0 auto;
-            background-color: #fff;
-            padding: 20px;
-            border-radius: 10px;
-            box-shadow: 0 0 10px rgba(0,0,0,0.1);
-        }
-        h1, h2 {
-            color: #8b4513;
-        }
-        .message {
-            border: 2px solid #deb887;
-            padding: 15px;
-            margin-bottom: 20px;
-            border-radius: 5px;
-        }
-        .message-content {
-            margin-bottom: 10px;
-        }
-        .message-meta {
-            font-size: 0.8em;
-            color: #777;
-        }
-        .avatar {
-            font-size: 2em;
-            margin-right: 10px;
-        }
-        .nav {
-            margin-bottom: 20px;
-        }
-        .nav a {
-            color: #8b4513;
-            margin-right: 10px;
-            text-decoration: none;
-        }
-        .dead-bee-image {
-            max-width: 100%;
-            height: auto;
-            margin-top: 10px;
-            border-radius: 5px;
-        }
-    </style>
+    <link rel="stylesheet" href="{{ asset_url('css/app.css') }}">
 </head>
-<body>
+<body class="profile-page">
     <div class="container">
         <div class="nav">
             <a href="{{ url_for('index') }}">Home</a>
@@ -664,22 +761,172 @@ PROFILE_HTML = '''
         {% for message in messages %}
             <div class="message">
                 <div class="message-content">{{ message.content }}</div>
-                <img src="data:image/png;base64,{{ message.image_data }}" alt="Dead Bee" class="dead-bee-image">
+                {% if message.has_image %}
+                    <img src="{{ url_for('message_image', message_id=message.id) }}" alt="Dead Bee" class="dead-bee-image" loading="lazy">
+                {% endif %}
                 <div class="message-meta">Posted on {{ message.timestamp }}</div>
             </div>
         {% endfor %}
+        {% if next_cursor %}
+            <div class="nav">
+                <a href="{{ url_for('profile', username=user.username, before=next_cursor[0].isoformat(), before_id=next_cursor[1]) }}">Older messages</a>
+            </div>
+        {% endif %}
     </div>
 </body>
 </html>
 '''
 
+# Serve the page templates above from memory under app/ names. Jinja then
+# compiles each one once and keeps it in its template cache instead of
+# re-parsing the source on every render_template_string() call.
+INLINE_TEMPLATES = {
+    'app/index.html': BASE_HTML,
+    'app/login.html': LOGIN_HTML,
+    'app/register.html': REGISTER_HTML,
+    'app/profile.html': PROFILE_HTML,
+}
+app.jinja_loader = ChoiceLoader([DictLoader(INLINE_TEMPLATES), app.jinja_loader])
+for template_name in INLINE_TEMPLATES:
+    app.jinja_env.get_template(template_name)
+
+def stats_token_required(view):
+    """Operational endpoints answer only requests carrying ``X-Stats-Token: <STATS_TOKEN>``."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = app.config.get('STATS_TOKEN')
+        header = request.headers.get('X-Stats-Token')
+        if not (token and header and hmac.compare_digest(header, token)):
+            return "Not found", 404
+        return view(*args, **kwargs)
+    return wrapper
+
+@app.route('/socket_stats')
+@stats_token_required
+def socket_stats():
+    with subscriptions_lock:
+        return jsonify({
+            'connections': len(subscriptions),
+            'rooms': len(room_members),
+            'subscriptions': sum(room_members.values()),
+            'largest_rooms': room_members.most_common(10)
+        })
+
+@app.route('/image_provider_stats')
+@stats_token_required
+def image_provider_stats():
+    return jsonify({
+        'deadline': image_generator.deadline,
+        'providers': image_generator.stats_snapshot(),
+        'admission': image_admission.stats(),
+    })
+
 @socketio.on('connect')
 def handle_connect():
-    logger.debug('Client connected')
+    ensure_outbox_dispatcher()
+    with subscriptions_lock:
+        subscriptions[request.sid] = set()
+        connections = len(subscriptions)
+    logger.debug(f'Client connected ({connections} connections)')
 
 @socketio.on('disconnect')
 def handle_disconnect():
-    logger.debug('Client disconnected')
+    with subscriptions_lock:
+        for message_id in subscriptions.pop(request.sid, ()):
+            _release_room(message_id)
+        connections = len(subscriptions)
+    logger.debug(f'Client disconnected ({connections} connections, {len(room_members)} rooms)')
+
+@socketio.on('subscribe')
+def handle_subscribe(data):
+    message_ids = _message_ids(data)
+    with subscriptions_lock:
+        subscribed = subscriptions.setdefault(request.sid, set())
+        for message_id in message_ids:
+            if message_id in subscribed or len(subscribed) >= MAX_SUBSCRIPTIONS_PER_CLIENT:
+                continue
+            join_room(message_room(message_id))
+            subscribed.add(message_id)
+            room_members[message_id] += 1
+
+@socketio.on('unsubscribe')
+def handle_unsubscribe(data):
+    message_ids = _message_ids(data)
+    with subscriptions_lock:
+        subscribed = subscriptions.get(request.sid, set())
+        for message_id in message_ids:
+            if message_id not in subscribed:
+                continue
+            leave_room(message_room(message_id))
+            subscribed.discard(message_id)
+            _release_room(message_id)
+
+@socketio.on('catch_up')
+def handle_catch_up(data):
+    """Already-dispatched events after the client's cursor, for broadcasts and the given messages.
+
+    Returns ``{'events': [...], 'complete': bool}`` as the acknowledgement; when
+    not complete the client is too far behind and should reload instead.
+    """
+    try:
+        after = int(data.get('after', 0)) if isinstance(data, dict) else 0
+    except (TypeError, ValueError):
+        after = 0
+    rooms = [message_room(message_id) for message_id in _message_ids(data)][:MAX_SUBSCRIPTIONS_PER_CLIENT]
+    oldest = db.session.scalar(db.select(db.func.min(OutboxEvent.id)))
+    if oldest is not None and after < oldest - 1:
+        return {'events': [], 'complete': False}  # the events it missed have been pruned
+    events = db.session.scalars(
+        db.select(OutboxEvent)
+        .where(OutboxEvent.id > after, OutboxEvent.id <= dispatched_cursor(),
+               db.or_(OutboxEvent.room.is_(None), OutboxEvent.room.in_(rooms)))
+        .order_by(OutboxEvent.id)
+        .limit(OUTBOX_CATCH_UP_LIMIT + 1)
+    ).all()
+    return {
+        'events': [{'event': event.event, 'data': dict(json.loads(event.payload), event_id=event.id)}
+                   for event in events[:OUTBOX_CATCH_UP_LIMIT]],
+        'complete': len(events) <= OUTBOX_CATCH_UP_LIMIT,
+    }
+
+def _message_ids(data):
+    if not isinstance(data, dict):
+        return set()
+    try:
+        return {int(message_id) for message_id in data.get('message_ids', [])}
+    except (TypeError, ValueError):
+        return set()
+
+def _release_room(message_id):
+    room_members[message_id] -= 1
+    if room_members[message_id] <= 0:
+        del room_members[message_id]
+
+# app.py has no migrations: tables added after its original schema are created
+# on startup when missing, along with the single rows they need.
+BOOTSTRAP_TABLES = [MessageScore.__table__, HotEpoch.__table__, OutboxEvent.__table__, OutboxCursor.__table__]
+
+def ensure_schema():
+    global outbox_ready
+    with app.app_context():
+        try:
+            db.metadata.create_all(db.engine, tables=BOOTSTRAP_TABLES)
+            if db.session.get(HotEpoch, HOT_EPOCH_ID) is None:
+                db.session.add(HotEpoch(id=HOT_EPOCH_ID, started_at=datetime.utcnow()))
+            if db.session.get(OutboxCursor, OUTBOX_CURSOR) is None:
+                db.session.add(OutboxCursor(name=OUTBOX_CURSOR, last_id=0))
+            db.session.commit()
+            outbox_ready = True
+        except IntegrityError:
+            db.session.rollback()  # another worker created the rows first
+            outbox_ready = True
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Could not create app.py's tables: {str(e)}")
+        finally:
+            db.session.remove()
+
+ensure_schema()
 
 if __name__ == '__main__':
     logger.info('Starting Dead Bee Society app')
@@ -0,0 +1,106 @@
+"""Moves old posts out of the hot tables.
+
+Nearly every read is for recent posts, so ``post``, ``comment`` and
+``post_categories`` hold only the last ARCHIVE_AFTER_DAYS days. Older posts are
+copied, with their comments and category links, into the ``archived_*`` tables
+and deleted from the hot ones, batch by batch, each batch in one transaction.
+The hot tables and their indexes then grow with recent activity instead of
+with all of history. Reads go through read_models, which falls through to the
+archive only when a page needs rows older than the hot tables hold.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+
+from models import (db, Post, Comment, PostScore, post_categories,
+                    ArchivedPost, ArchivedComment, archived_post_categories)
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_AFTER_DAYS = 90
+ARCHIVE_BATCH_SIZE = 500
+
+POST_COLUMNS = ('id', 'content', 'image_url', 'timestamp', 'user_id')
+COMMENT_COLUMNS = ('id', 'content', 'timestamp', 'user_id', 'post_id')
+
+
+def _copy(source, target, columns, where):
+    """INSERT INTO target (columns) SELECT columns FROM source WHERE where."""
+    select = sa.select(*(source.c[name] for name in columns)).where(where)
+    return sa.insert(target).from_select(list(columns), select)
+
+
+def archive_batch(cutoff, batch_size=ARCHIVE_BATCH_SIZE):
+    """Archive up to ``batch_size`` posts older than ``cutoff``; returns how many moved."""
+    posts, comments = Post.__table__, Comment.__table__
+    # Hot ids are never reused (post and comment are AUTOINCREMENT on SQLite),
+    # so archived rows keep theirs without colliding with later ones. FOR UPDATE
+    # also has SQLite take its write lock before the read, not at the first copy.
+    ids = db.session.scalars(
+        sa.select(posts.c.id)
+        .where(posts.c.timestamp < cutoff)
+        .order_by(posts.c.timestamp)
+        .limit(batch_size)
+        .with_for_update()).all()
+    if not ids:
+        return 0
+
+    db.session.execute(_copy(posts, ArchivedPost.__table__, POST_COLUMNS, posts.c.id.in_(ids)))
+    db.session.execute(_copy(comments, ArchivedComment.__table__, COMMENT_COLUMNS, comments.c.post_id.in_(ids)))
+    db.session.execute(_copy(post_categories, archived_post_categories, ('post_id', 'category_id'),
+                             post_categories.c.post_id.in_(ids)))
+    db.session.execute(sa.delete(comments).where(comments.c.post_id.in_(ids)))
+    db.session.execute(sa.delete(post_categories).where(post_categories.c.post_id.in_(ids)))
+    db.session.execute(sa.delete(PostScore.__table__).where(PostScore.__table__.c.post_id.in_(ids)))
+    db.session.execute(sa.delete(posts).where(posts.c.id.in_(ids)))
+    db.session.commit()
+    return len(ids)
+
+
+def archive_old_posts(days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH_SIZE, now=None):
+    """Archive every post older than ``days``; returns the total moved."""
+    cutoff = (now or datetime.utcnow()) - timedelta(days=days)
+    total = 0
+    while True:
+        try:
+            moved = archive_batch(cutoff, batch_size)
+        except Exception:
+            db.session.rollback()
+            raise
+        total += moved
+        if moved < batch_size:
+            break
+    logger.info(f"Archived {total} posts older than {cutoff:%Y-%m-%d}")
+    return total
+
+
+def start_archiver(app, interval):
+    def run():
+        while True:
+            time.sleep(interval)
+            with app.app_context():
+                try:
+                    archive_old_posts(app.config.get('ARCHIVE_AFTER_DAYS', ARCHIVE_AFTER_DAYS),
+                                      app.config.get('ARCHIVE_BATCH_SIZE', ARCHIVE_BATCH_SIZE))
+                except Exception as e:
+                    logger.error(f"Archiving old posts failed: {str(e)}")
+
+    thread = threading.Thread(target=run, name='post-archiver', daemon=True)
+    thread.start()
+    return thread
+
+
+def init_archive(app):
+    @app.cli.command('archive-posts')
+    def archive_posts_command():
+        """Move posts older than ARCHIVE_AFTER_DAYS into the archive tables."""
+        moved = archive_old_posts(app.config.get('ARCHIVE_AFTER_DAYS', ARCHIVE_AFTER_DAYS),
+                                  app.config.get('ARCHIVE_BATCH_SIZE', ARCHIVE_BATCH_SIZE))
+        print(f'Archived {moved} posts')
+
+    interval = app.config.get('ARCHIVE_INTERVAL')
+    if interval:
+        start_archiver(app, interval)
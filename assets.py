@@ -0,0 +1,136 @@
+"""Fingerprinted, precompressed static assets.
+
+``python assets.py`` copies each file in ASSETS to static/dist/ under a
+content-hashed name, writes gzip and (if the ``brotli`` package is installed)
+brotli variants next to it, and records the mapping in static/dist/manifest.json.
+Templates call ``asset_url('css/styles.css')``; without a manifest that falls
+back to the plain /static URL, so development works without a build step.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import sys
+
+from flask import request, send_from_directory, url_for
+from werkzeug.exceptions import NotFound
+
+logger = logging.getLogger(__name__)
+
+STATIC_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+
+ASSETS = [
+    'css/styles.css',
+    'css/app.css',
+    'js/main.js',
+    'js/app.js',
+    'images/placeholder.svg',
+]
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# Precompressed variants in order of preference: (Content-Encoding, file suffix).
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+
+# Compressing images that are already compressed only wastes CPU at build time.
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'image/svg+xml', 'application/json')
+
+
+def fingerprint(name, content):
+    root, ext = os.path.splitext(name)
+    return f'{root}.{hashlib.sha256(content).hexdigest()[:12]}{ext}'
+
+
+def build(static_folder=STATIC_FOLDER, assets=ASSETS):
+    """Write hashed and precompressed copies of ``assets``; return the manifest."""
+    try:
+        import brotli  # optional: only used to write .br variants
+    except ImportError:
+        brotli = None
+        logger.warning('brotli is not installed; only gzip variants will be built')
+
+    dist = os.path.join(static_folder, DIST_DIR)
+    manifest = {}
+    for name in assets:
+        with open(os.path.join(static_folder, name), 'rb') as f:
+            content = f.read()
+        hashed = fingerprint(name, content)
+        target = os.path.join(dist, hashed)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as f:
+            f.write(content)
+        mimetype = mimetypes.guess_type(name)[0] or ''
+        if mimetype.startswith(COMPRESSIBLE_TYPES):
+            with open(f'{target}.gz', 'wb') as f:
+                f.write(gzip.compress(content, compresslevel=9, mtime=0))
+            if brotli is not None:
+                with open(f'{target}.br', 'wb') as f:
+                    f.write(brotli.compress(content, quality=11))
+        manifest[name] = hashed
+
+    with open(os.path.join(dist, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, DIST_DIR, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def accepted_encodings():
+    accept = request.accept_encodings
+    return [(encoding, suffix) for encoding, suffix in PRECOMPRESSED if accept[encoding]]
+
+
+def init_assets(app):
+    dist = os.path.join(app.static_folder, DIST_DIR)
+    manifest = load_manifest(app.static_folder)
+    if not manifest:
+        logger.info('No asset manifest found; serving unfingerprinted static files')
+
+    def asset_url(name):
+        hashed = manifest.get(name)
+        if hashed is None:
+            return url_for('static', filename=name)
+        return url_for('assets', filename=hashed)
+
+    def assets(filename):
+        if filename not in manifest_values:
+            raise NotFound()
+        mimetype = mimetypes.guess_type(filename)[0]
+        for encoding, suffix in accepted_encodings():
+            variant = f'{filename}{suffix}'
+            if os.path.exists(os.path.join(dist, variant)):
+                response = send_from_directory(dist, variant, mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE)
+                response.headers['Content-Encoding'] = encoding
+                break
+        else:
+            response = send_from_directory(dist, filename, max_age=IMMUTABLE_MAX_AGE)
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        response.vary.add('Accept-Encoding')
+        return response
+
+    manifest_values = set(manifest.values())
+    app.add_url_rule('/assets/<path:filename>', 'assets', assets)
+    app.jinja_env.globals['asset_url'] = asset_url
+
+    @app.cli.command('build-assets')
+    def build_assets_command():
+        """Fingerprint and precompress static assets into static/dist."""
+        for name, hashed in build(app.static_folder).items():
+            print(f'{name} -> {DIST_DIR}/{hashed}')
+
+
+if __name__ == '__main__':
+    for name, hashed in build().items():
+        print(f'{name} -> {DIST_DIR}/{hashed}')
+    sys.exit(0)
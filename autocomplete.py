@@ -0,0 +1,161 @@
+import bisect
+import logging
+import threading
+import time
+
+import sqlalchemy as sa
+from flask import current_app
+
+from db_routing import RoutingSession
+from models import db, User, Category
+
+logger = logging.getLogger(__name__)
+
+
+class PrefixIndex:
+    """Case-insensitive prefix lookup over a sorted array of names."""
+
+    def __init__(self):
+        self._keys = []
+        self._entries = []
+        self._lock = threading.Lock()
+        self.built_at = None
+        # Entries added while a build loads its snapshot; the snapshot may predate them.
+        self._added_during_build = None
+        # Held by whichever thread is (re)building, so there is only one at a time.
+        self.rebuilding = threading.Lock()
+
+    def build(self, load):
+        """Replace the index with the ``(kind, label, ref)`` entries ``load()`` returns.
+
+        Entries ``add``ed while ``load`` runs are kept, even if its snapshot was
+        read before they were committed.
+        """
+        with self._lock:
+            self._added_during_build = []
+        try:
+            rows = sorted((label.lower(), (kind, label, ref)) for kind, label, ref in load())
+            keys = [key for key, _ in rows]
+            values = [entry for _, entry in rows]
+            with self._lock:
+                self._keys, self._entries = keys, values
+                for entry in self._added_during_build:
+                    self._insert(entry)
+                self.built_at = time.monotonic()
+        finally:
+            with self._lock:
+                self._added_during_build = None
+
+    def add(self, kind, label, ref):
+        entry = (kind, label, ref)
+        with self._lock:
+            if self._added_during_build is not None:
+                self._added_during_build.append(entry)
+            self._insert(entry)
+
+    def _insert(self, entry):
+        key = entry[1].lower()
+        position = bisect.bisect_left(self._keys, key)
+        while position < len(self._keys) and self._keys[position] == key:
+            if self._entries[position] == entry:
+                return
+            position += 1
+        self._keys.insert(position, key)
+        self._entries.insert(position, entry)
+
+    def search(self, prefix, limit=10):
+        prefix = prefix.lower()
+        if not prefix:
+            return []
+        with self._lock:
+            position = bisect.bisect_left(self._keys, prefix)
+            end = min(position + limit, len(self._keys))
+            matches = []
+            while position < end and self._keys[position].startswith(prefix):
+                matches.append(self._entries[position])
+                position += 1
+            return matches
+
+    def __len__(self):
+        return len(self._keys)
+
+
+def load_entries():
+    users = db.session.execute(sa.select(User.username, User.username)).all()
+    categories = db.session.execute(sa.select(Category.name, Category.id)).all()
+    return [('user', name, ref) for name, ref in users] + [('category', name, ref) for name, ref in categories]
+
+
+def init_autocomplete(app):
+    app.extensions['autocomplete'] = PrefixIndex()
+    return app.extensions['autocomplete']
+
+
+def _rebuild(index):
+    started = time.perf_counter()
+    index.build(load_entries)
+    logger.info(f"Built autocomplete index with {len(index)} entries in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+
+def _rebuild_in_background(app, index):
+    def run():
+        with app.app_context():
+            try:
+                _rebuild(index)
+            except Exception as e:
+                logger.error(f"Rebuilding the autocomplete index failed: {str(e)}")
+            finally:
+                db.session.remove()
+                index.rebuilding.release()
+
+    threading.Thread(target=run, name='autocomplete-rebuild', daemon=True).start()
+
+
+def get_index():
+    """The app's index, built on first use and refreshed once older than AUTOCOMPLETE_REFRESH_SECONDS.
+
+    Writes made by this worker are applied as they commit; the periodic rebuild
+    picks up names registered through other workers. Only the first build runs
+    in a request (the others wait for it); refreshes run on one background
+    thread while requests keep using the current index.
+    """
+    index = current_app.extensions['autocomplete']
+    if index.built_at is None:
+        with index.rebuilding:
+            if index.built_at is None:
+                _rebuild(index)
+        return index
+    max_age = current_app.config.get('AUTOCOMPLETE_REFRESH_SECONDS', 300)
+    if time.monotonic() - index.built_at > max_age and index.rebuilding.acquire(blocking=False):
+        if time.monotonic() - index.built_at > max_age:
+            _rebuild_in_background(current_app._get_current_object(), index)
+        else:
+            index.rebuilding.release()
+    return index
+
+
+@sa.event.listens_for(User, 'after_insert')
+def _queue_user(mapper, connection, target):
+    sa.orm.object_session(target).info.setdefault('autocomplete_pending', []).append(('user', target.username, target.username))
+
+
+@sa.event.listens_for(Category, 'after_insert')
+def _queue_category(mapper, connection, target):
+    sa.orm.object_session(target).info.setdefault('autocomplete_pending', []).append(('category', target.name, target.id))
+
+
+@sa.event.listens_for(RoutingSession, 'after_commit')
+def _apply_pending(session):
+    pending = session.info.pop('autocomplete_pending', None)
+    if not pending:
+        return
+    index = current_app.extensions.get('autocomplete')
+    if index is None:
+        return
+    for kind, label, ref in pending:
+        index.add(kind, label, ref)
+
+
+@sa.event.listens_for(RoutingSession, 'after_rollback')
+def _drop_pending(session):
+    session.info.pop('autocomplete_pending', None)
@@ -0,0 +1,101 @@
+"""Memory and time for building the feed: full ORM objects vs read_models projections.
+
+    python bench_read_models.py [--posts 2000] [--image-kb 48] [--runs 5]
+
+Seeds a throwaway SQLite database (each post gets a base64 image of
+``--image-kb`` KB, like a generated bee), then loads the whole feed both ways
+and touches every field the index template reads.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import sqlalchemy as sa
+from sqlalchemy.orm import selectinload
+
+
+def touch(posts):
+    for post in posts:
+        post.content, post.timestamp, post.author.username
+        for category in post.categories:
+            category.id, category.name
+        for comment in post.comments:
+            comment.content, comment.timestamp, comment.author.username
+
+
+def load_orm():
+    from models import Post, Comment
+
+    posts = (Post.query
+             .options(selectinload(Post.author), selectinload(Post.categories),
+                      selectinload(Post.comments).selectinload(Comment.author))
+             .order_by(Post.timestamp.desc())
+             .all())
+    for post in posts:
+        post.image_url  # what the template used to inline
+    touch(posts)
+    return posts
+
+
+def load_projection():
+    from models import Post
+    from read_models import iter_post_rows, post_rows_query
+
+    posts = list(iter_post_rows(post_rows_query().order_by(Post.timestamp.desc()), comments=True))
+    touch(posts)
+    return posts
+
+
+def measure(db, load, runs):
+    timings = []
+    for _ in range(runs):
+        db.session.remove()
+        start = time.perf_counter()
+        load()
+        timings.append(time.perf_counter() - start)
+
+    db.session.remove()
+    tracemalloc.start()
+    posts = load()
+    retained, peak = tracemalloc.get_traced_memory()
+    blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+    tracemalloc.stop()
+    return statistics.median(timings), peak, retained, blocks, len(posts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--posts', type=int, default=2000)
+    parser.add_argument('--image-kb', type=int, default=48)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        os.environ.setdefault('WARM_UP_ON_START', '0')
+        from main import create_app
+        from models import db, Post
+        from index_advisor import seed
+
+        app = create_app()
+        with app.app_context():
+            db.create_all()
+            seed(posts=args.posts, comments=args.posts * 3)
+            image = 'A' * (args.image_kb * 1024)
+            db.session.execute(sa.update(Post).values(image_url=image))
+            db.session.commit()
+
+            print(f"{'loader':<12}{'median ms':>11}{'peak MiB':>10}{'retained MiB':>14}{'live blocks':>13}{'posts':>7}")
+            for name, load in (('orm', load_orm), ('projection', load_projection)):
+                seconds, peak, retained, blocks, count = measure(db, load, args.runs)
+                print(f'{name:<12}{seconds * 1000:>11.1f}{peak / 2**20:>10.1f}{retained / 2**20:>14.1f}'
+                      f'{blocks:>13}{count:>7}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
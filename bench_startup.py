@@ -0,0 +1,57 @@
+"""Cold-start benchmark for the app factory.
+
+Runs ``create_app()`` in fresh interpreters and fails when the median time goes
+over budget or when modules that should load lazily show up at import time.
+
+    python bench_startup.py [--runs 7] [--budget-ms 1500]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Modules that must not be imported until a request (or image generation) needs them.
+LAZY_MODULES = ['views', 'forms', 'flask_wtf', 'wtforms', 'utils', 'requests', 'email_validator', 'numpy', 'scipy']
+
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+from main import create_app
+app = create_app()
+elapsed = time.perf_counter() - start
+print(json.dumps({"ms": elapsed * 1000, "loaded": [m for m in %r if m in sys.modules]}))
+''' % (LAZY_MODULES,)
+
+def run_probe():
+    env = dict(os.environ)
+    env.setdefault('DATABASE_URL', 'sqlite://')
+    env.pop('WARM_UP_ON_START', None)
+    output = subprocess.run([sys.executable, '-c', PROBE], env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=7)
+    parser.add_argument('--budget-ms', type=float, default=float(os.environ.get('STARTUP_BUDGET_MS', 1500)))
+    args = parser.parse_args()
+
+    results = [run_probe() for _ in range(args.runs)]
+    timings = [result['ms'] for result in results]
+    median = statistics.median(timings)
+    eager = sorted({module for result in results for module in result['loaded']})
+
+    print(f"create_app() over {args.runs} runs: median {median:.1f} ms, min {min(timings):.1f} ms, max {max(timings):.1f} ms")
+    failed = False
+    if eager:
+        print(f"FAIL: imported at startup: {', '.join(eager)}")
+        failed = True
+    if median > args.budget_ms:
+        print(f"FAIL: median {median:.1f} ms is over the {args.budget_ms:.0f} ms budget")
+        failed = True
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,48 @@
+"""Per-request render time of app.py's pages: render_template_string vs the compiled registry.
+
+    python bench_templates.py [--renders 2000]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from flask import render_template, render_template_string
+import app as legacy
+
+def sample_context(name, messages=20):
+    user = SimpleNamespace(username='drone', avatar='🐝')
+    rows = [SimpleNamespace(id=i, content=f'dead bee {i}', has_image=True, timestamp=datetime.utcnow(),
+                            user=user, reactions=[], comments=[]) for i in range(messages)]
+    if name == 'app/index.html':
+        return {'messages': rows}
+    if name == 'app/profile.html':
+        return {'user': user, 'messages': rows, 'next_cursor': None}
+    return {}
+
+def per_render_us(render, renders):
+    start = time.perf_counter()
+    for _ in range(renders):
+        render()
+    return (time.perf_counter() - start) / renders * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--renders', type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'page':<20}{'string (us)':>14}{'registry (us)':>16}{'speedup':>10}")
+    with legacy.app.test_request_context('/'):
+        for name, source in legacy.INLINE_TEMPLATES.items():
+            context = sample_context(name)
+            before = per_render_us(lambda: render_template_string(source, **context), args.renders)
+            after = per_render_us(lambda: render_template(name, **context), args.renders)
+            print(f'{name:<20}{before:>14.1f}{after:>16.1f}{before / after:>9.1f}x')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,7 +1,13 @@
 import os
 
 class Config:
-    SECRET_KEY = os.urandom(32)
+    # Must be the same on every worker. To rotate, put the old key first in the
+    # comma-separated SECRET_KEY_FALLBACKS; sessions it signed stay valid.
+    SECRET_KEY = os.environ.get('SECRET_KEY')
+    SECRET_KEY_FALLBACKS = [key.strip() for key in os.environ.get('SECRET_KEY_FALLBACKS', '').split(',') if key.strip()]
+    # 'cookie' (signed client-side sessions) or 'filesystem' (server-side, in SESSION_FILE_DIR).
+    SESSION_BACKEND = os.environ.get('SESSION_BACKEND', 'cookie')
+    SESSION_FILE_DIR = os.environ.get('SESSION_FILE_DIR')
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
     if SQLALCHEMY_DATABASE_URI and SQLALCHEMY_DATABASE_URI.startswith("postgres://"):
         SQLALCHEMY_DATABASE_URI = SQLALCHEMY_DATABASE_URI.replace("postgres://", "postgresql://", 1)
@@ -12,3 +18,74 @@ class Config:
         'pool_pre_ping': True,
         'pool_recycle': 300,
     }
+
+    # Comma-separated read replica URLs; read-only requests are spread across them.
+    DATABASE_REPLICA_URLS = [url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+    DATABASE_REPLICA_URLS = [url.replace("postgres://", "postgresql://", 1) for url in DATABASE_REPLICA_URLS]
+    SQLALCHEMY_BINDS = {f'replica_{i}': url for i, url in enumerate(DATABASE_REPLICA_URLS)}
+    DB_REPLICA_CHECK_INTERVAL = float(os.environ.get('DB_REPLICA_CHECK_INTERVAL', 10))
+    DB_REPLICA_RETRY_AFTER = float(os.environ.get('DB_REPLICA_RETRY_AFTER', 30))
+    # How long a user's reads stay on the primary after they write.
+    DB_READ_YOUR_WRITES_SECONDS = float(os.environ.get('DB_READ_YOUR_WRITES_SECONDS', 5))
+
+    # SQLite (single node): a sqlite:///path DATABASE_URL runs in WAL mode with these
+    # pragmas, and writers queue for its one write lock (see sqlite_backend).
+    SQLITE_TUNING = os.environ.get('SQLITE_TUNING', '1').lower() in ('1', 'true', 'yes')
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_CACHE_SIZE_KB = int(os.environ.get('SQLITE_CACHE_SIZE_KB', 65536))
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 2**20))
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    # Serve post search's substring matches from FTS5 trigram indexes when SQLite has them.
+    SQLITE_FTS = os.environ.get('SQLITE_FTS', '1').lower() in ('1', 'true', 'yes')
+
+    # Prime the DB pool, views and template cache in a background thread at startup.
+    WARM_UP_ON_START = os.environ.get('WARM_UP_ON_START', '').lower() in ('1', 'true', 'yes')
+
+    # Rebuild the in-memory autocomplete index at most this often to pick up other workers' writes.
+    AUTOCOMPLETE_REFRESH_SECONDS = float(os.environ.get('AUTOCOMPLETE_REFRESH_SECONDS', 300))
+
+    # Hot feed: engagement halves in weight every HOT_HALF_LIFE_HOURS. Scores are
+    # rescaled every HOT_RENORMALIZE_INTERVAL seconds from a background thread; set it
+    # to 0 only if a scheduler runs `flask --app main renormalize-hot` instead.
+    HOT_HALF_LIFE_HOURS = float(os.environ.get('HOT_HALF_LIFE_HOURS', 12))
+    HOT_RENORMALIZE_INTERVAL = float(os.environ.get('HOT_RENORMALIZE_INTERVAL', 3600))
+    HOT_PAGE_SIZE = int(os.environ.get('HOT_PAGE_SIZE', 50))
+
+    # Posts older than ARCHIVE_AFTER_DAYS move to the archive tables, either from
+    # `flask --app main archive-posts` or every ARCHIVE_INTERVAL seconds in-process.
+    ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 90))
+    ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', 500))
+    ARCHIVE_INTERVAL = float(os.environ.get('ARCHIVE_INTERVAL', 0))
+
+    # Profiling: requests with `X-Profile: <PROFILE_TOKEN>`, plus a random
+    # PROFILE_SAMPLE_RATE fraction, get a sampled stack profile in PROFILE_DIR.
+    # Requests slower than SLOW_REQUEST_MS (0 disables) are logged with SQL timings.
+    PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN')
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+    PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', 5))
+    PROFILE_DIR = os.environ.get('PROFILE_DIR')
+    SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', 1000))
+
+    # "Who to follow": top RECOMMENDATIONS_PER_USER per user, recomputed for changed
+    # users by `flask --app main recommend-follows` or every RECOMMENDATIONS_INTERVAL seconds.
+    RECOMMENDATIONS_PER_USER = int(os.environ.get('RECOMMENDATIONS_PER_USER', 10))
+    RECOMMENDATIONS_INTERVAL = float(os.environ.get('RECOMMENDATIONS_INTERVAL', 0))
+    PROFILE_SUGGESTIONS = int(os.environ.get('PROFILE_SUGGESTIONS', 5))
+
+    # Atom feeds carry the newest FEED_SIZE posts. Their XML is cached per worker,
+    # dropped when a post changes here and rebuilt after FEED_CACHE_SECONDS to pick up
+    # other workers' posts; pollers may reuse a copy for FEED_MAX_AGE seconds.
+    FEED_SIZE = int(os.environ.get('FEED_SIZE', 20))
+    FEED_CACHE_SECONDS = float(os.environ.get('FEED_CACHE_SECONDS', 300))
+    FEED_CACHE_ENTRIES = int(os.environ.get('FEED_CACHE_ENTRIES', 1000))
+    FEED_MAX_AGE = int(os.environ.get('FEED_MAX_AGE', 60))
+    # Scheme and host that feed links are built on, e.g. https://deadbee.example;
+    # unset, the requested host is used and a cached feed is reused only for its host.
+    FEED_BASE_URL = os.environ.get('FEED_BASE_URL')
+
+    PROFILE_PAGE_SIZE = int(os.environ.get('PROFILE_PAGE_SIZE', 20))
+
+    # Long pages are streamed: rows are fetched FEED_BATCH_SIZE at a time and the
+    # HTML is compressed and flushed every STREAM_BLOCK_SIZE characters.
+    FEED_BATCH_SIZE = int(os.environ.get('FEED_BATCH_SIZE', 100))
+    STREAM_BLOCK_SIZE = int(os.environ.get('STREAM_BLOCK_SIZE', 8192))
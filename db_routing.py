@@ -0,0 +1,154 @@
+import itertools
+import logging
+import threading
+import time
+
+import sqlalchemy as sa
+from flask import current_app, has_request_context, request, session as flask_session
+from flask_sqlalchemy.session import Session
+
+logger = logging.getLogger(__name__)
+
+READ_ONLY_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS'])
+STICKY_SESSION_KEY = '_db_primary_until'
+
+
+class ReplicaSet:
+    """Round-robin over the replica binds, skipping ones that failed a health check."""
+
+    def __init__(self, bind_keys, check_interval=10.0, retry_after=30.0):
+        self.bind_keys = list(bind_keys)
+        self.check_interval = check_interval
+        self.retry_after = retry_after
+        self._state = {key: {'healthy': True, 'checked_at': 0.0} for key in self.bind_keys}
+        self._cycle = itertools.cycle(self.bind_keys) if self.bind_keys else None
+        self._lock = threading.Lock()
+
+    def choose(self, engines):
+        if not self.bind_keys:
+            return None
+        for _ in range(len(self.bind_keys)):
+            with self._lock:
+                key = next(self._cycle)
+            if self._is_healthy(key, engines[key]):
+                return engines[key]
+        return None
+
+    def mark_unhealthy(self, key):
+        with self._lock:
+            self._state[key] = {'healthy': False, 'checked_at': time.monotonic()}
+        logger.warning(f"Replica {key} marked unhealthy")
+
+    def status(self):
+        with self._lock:
+            return {key: dict(state) for key, state in self._state.items()}
+
+    def _is_healthy(self, key, engine):
+        now = time.monotonic()
+        state = self._state[key]
+        interval = self.check_interval if state['healthy'] else self.retry_after
+        if now - state['checked_at'] < interval:
+            return state['healthy']
+
+        healthy = check_engine(engine)
+        with self._lock:
+            self._state[key] = {'healthy': healthy, 'checked_at': now}
+        if not healthy:
+            logger.warning(f"Replica {key} failed health check")
+        return healthy
+
+
+def check_engine(engine):
+    try:
+        with engine.connect() as connection:
+            connection.execute(sa.text('SELECT 1'))
+        return True
+    except sa.exc.SQLAlchemyError:
+        return False
+
+
+class RoutingSession(Session):
+    """Sends reads from read-only requests to a replica and everything else to the primary.
+
+    A session goes to the primary once it has flushed, when the request is not a
+    GET/HEAD/OPTIONS, inside ``use_primary()``, or while the user's read-your-writes
+    window from a previous commit is still open.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._can_use_replica(clause):
+            replicas = self._db_replicas()
+            if replicas is not None:
+                engine = replicas.choose(self._db.engines)
+                if engine is not None:
+                    return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _db_replicas(self):
+        return current_app.extensions.get('db_replicas')
+
+    def _can_use_replica(self, clause):
+        if self._flushing or self.info.get('wrote') or self.info.get('force_primary'):
+            return False
+        if isinstance(clause, sa.sql.dml.UpdateBase):
+            return False
+        if not has_request_context() or request.method not in READ_ONLY_METHODS:
+            return False
+        return flask_session.get(STICKY_SESSION_KEY, 0) <= time.time()
+
+
+class use_primary:
+    """Context manager pinning the current session's reads to the primary."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        info = self.db.session.info
+        self._previous = info.get('force_primary', False)
+        info['force_primary'] = True
+        return self.db.session
+
+    def __exit__(self, *exc_info):
+        self.db.session.info['force_primary'] = self._previous
+        return False
+
+
+@sa.event.listens_for(RoutingSession, 'after_flush')
+def _mark_wrote(session, flush_context):
+    session.info['wrote'] = True
+
+
+@sa.event.listens_for(RoutingSession, 'after_commit')
+def _stick_to_primary(session):
+    if session.info.pop('wrote', False) and has_request_context():
+        sticky_seconds = current_app.config.get('DB_READ_YOUR_WRITES_SECONDS', 5.0)
+        flask_session[STICKY_SESSION_KEY] = time.time() + sticky_seconds
+
+
+@sa.event.listens_for(RoutingSession, 'after_rollback')
+def _reset_wrote(session):
+    session.info.pop('wrote', None)
+
+
+def _replica_error_handler(replicas, key):
+    def handle_error(context):
+        if context.is_disconnect:
+            replicas.mark_unhealthy(key)
+    return handle_error
+
+
+def init_replicas(app, db):
+    """Wire replica health tracking and read-your-writes stickiness into ``app``."""
+    bind_keys = sorted(key for key in app.config.get('SQLALCHEMY_BINDS', {}) if key.startswith('replica_'))
+    app.extensions['db_replicas'] = ReplicaSet(
+        bind_keys,
+        check_interval=app.config.get('DB_REPLICA_CHECK_INTERVAL', 10.0),
+        retry_after=app.config.get('DB_REPLICA_RETRY_AFTER', 30.0),
+    )
+    with app.app_context():
+        for key in bind_keys:
+            sa.event.listen(db.engines[key], 'handle_error', _replica_error_handler(app.extensions['db_replicas'], key))
+    if bind_keys:
+        logger.info(f"Routing read-only requests across replicas: {', '.join(bind_keys)}")
+    return app.extensions['db_replicas']
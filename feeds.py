@@ -0,0 +1,173 @@
+"""Atom feeds of a user's or a category's newest posts.
+
+Each feed is the newest FEED_SIZE posts rendered from ``feed.xml``, with
+images linked to ``post_image`` rather than inlined. The XML is cached
+per feed in a ``FeedCache``; committing a new, changed or deleted post drops
+the feeds of its author and categories in this worker, and entries older than
+FEED_CACHE_SECONDS are rebuilt to pick up other workers' posts. Responses carry
+an ETag and Last-Modified, so pollers mostly get a 304.
+
+Links in the XML are absolute. They are built on FEED_BASE_URL when it is set;
+otherwise on the requested host, and a cached feed is only served back to
+requests for the host it was built for.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import sqlalchemy as sa
+from flask import current_app, make_response, render_template, request, url_for
+
+from db_routing import RoutingSession
+from models import Post
+from read_models import HOT, ARCHIVE, post_rows, post_rows_query
+
+FEED_SIZE = 20
+FEED_CACHE_ENTRIES = 1000
+
+
+class CachedFeed:
+    __slots__ = ('xml', 'etag', 'updated', 'built_at', 'base_url')
+
+    def __init__(self, xml, updated, base_url):
+        self.xml = xml
+        self.base_url = base_url
+        self.etag = hashlib.sha1(xml).hexdigest()
+        self.updated = updated
+        self.built_at = time.monotonic()
+
+
+class FeedCache:
+    """Least-recently-used ``CachedFeed``s by key, e.g. ``('user', 7)``."""
+
+    def __init__(self, max_entries=FEED_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._feeds = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, max_age, base_url):
+        with self._lock:
+            feed = self._feeds.get(key)
+            if feed is None or feed.base_url != base_url or time.monotonic() - feed.built_at > max_age:
+                return None
+            self._feeds.move_to_end(key)
+            return feed
+
+    def put(self, key, feed):
+        with self._lock:
+            self._feeds[key] = feed
+            self._feeds.move_to_end(key)
+            while len(self._feeds) > self.max_entries:
+                self._feeds.popitem(last=False)
+
+    def invalidate(self, keys):
+        with self._lock:
+            for key in keys:
+                self._feeds.pop(key, None)
+
+
+def init_feeds(app):
+    app.extensions['feeds'] = FeedCache(app.config.get('FEED_CACHE_ENTRIES', FEED_CACHE_ENTRIES))
+    return app.extensions['feeds']
+
+
+def newest_posts(build, limit):
+    """The newest ``limit`` posts from ``build(tables)``, topped up from the archive."""
+    posts = post_rows(build(HOT).limit(limit), tables=HOT)
+    if len(posts) < limit:
+        posts += post_rows(build(ARCHIVE).limit(limit - len(posts)), tables=ARCHIVE)
+    return posts
+
+
+def user_feed_query(user_id):
+    def build(tables):
+        return (post_rows_query(tables)
+                .where(tables.post.user_id == user_id)
+                .order_by(tables.post.timestamp.desc(), tables.post.id.desc()))
+    return build
+
+
+def category_feed_query(category_id):
+    def build(tables):
+        links = tables.post_categories
+        return (post_rows_query(tables)
+                .join(links, links.c.post_id == tables.post.id)
+                .where(links.c.category_id == category_id)
+                .order_by(tables.post.timestamp.desc(), tables.post.id.desc()))
+    return build
+
+
+def base_url():
+    return (current_app.config.get('FEED_BASE_URL') or request.host_url).rstrip('/')
+
+
+def external_url(endpoint, **values):
+    """An absolute URL for a feed, on FEED_BASE_URL or else the requested host."""
+    return base_url() + url_for(endpoint, **values)
+
+
+def feed_response(key, build, title, alternate_url):
+    """An Atom response for the feed ``key``, from the cache when it is fresh."""
+    cache = current_app.extensions['feeds']
+    base = base_url()
+    feed = cache.get(key, current_app.config.get('FEED_CACHE_SECONDS', 300), base)
+    if feed is None:
+        posts = newest_posts(build, current_app.config.get('FEED_SIZE', FEED_SIZE))
+        updated = posts[0].timestamp if posts else None
+        xml = render_template('feed.xml', title=title, alternate_url=alternate_url,
+                              feed_url=external_url(request.endpoint, **request.view_args),
+                              updated=updated or datetime.utcnow(), posts=posts, entry_url=entry_url,
+                              external_url=external_url).encode('utf-8')
+        feed = CachedFeed(xml, updated, base)
+        cache.put(key, feed)
+
+    response = make_response(feed.xml)
+    response.mimetype = 'application/atom+xml'
+    response.set_etag(feed.etag)
+    if feed.updated is not None:
+        response.last_modified = feed.updated
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config.get('FEED_MAX_AGE', 60)
+    return response.make_conditional(request)
+
+
+def entry_url(post):
+    return external_url('profile', username=post.author.username, _anchor=f'post-{post.id}')
+
+
+def _loaded_feed_keys(post):
+    # Only state already in memory: loading inside a flush event would emit SQL
+    # mid-flush (and a deleted row is gone). Feeds it misses expire after
+    # FEED_CACHE_SECONDS.
+    state = sa.inspect(post)
+    keys = {('user', user_id) for user_id in state.attrs.user_id.history.sum() if user_id is not None}
+    for category in state.attrs.categories.history.sum():
+        identity = sa.inspect(category).identity
+        if identity is not None:
+            keys.add(('category', identity[0]))
+    return keys
+
+
+@sa.event.listens_for(RoutingSession, 'after_flush')
+def _queue_feed_invalidation(session, flush_context):
+    keys = session.info.setdefault('feeds_pending', set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Post):
+            keys.update(_loaded_feed_keys(obj))
+
+
+@sa.event.listens_for(RoutingSession, 'after_commit')
+def _invalidate_feeds(session):
+    keys = session.info.pop('feeds_pending', None)
+    if not keys:
+        return
+    cache = current_app.extensions.get('feeds')
+    if cache is not None:
+        cache.invalidate(keys)
+
+
+@sa.event.listens_for(RoutingSession, 'after_rollback')
+def _drop_feed_invalidation(session):
+    session.info.pop('feeds_pending', None)
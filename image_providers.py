@@ -0,0 +1,280 @@
+"""Pluggable image providers with a deadline and a local fallback.
+
+A provider is anything with a ``name`` and ``generate(prompt)`` returning
+``(base64_png, error)``, the same contract as ``utils.generate_dead_bee_image``.
+``ImageGenerator`` runs the primary provider on a worker thread and waits at
+most ``deadline`` seconds. If the primary fails, or has not answered in time,
+the fallback draws a bee locally in a few milliseconds. When the primary
+answers late, the ``on_late_image`` callback gets the real image to store.
+Calls never queue: with every worker busy the fallback is used at once.
+
+Procedural images carry a PNG text chunk (see ``is_procedural``) so they can be
+served with a short cache lifetime until the real image replaces them.
+"""
+import base64
+import hashlib
+import logging
+import math
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+logger = logging.getLogger(__name__)
+
+PROCEDURAL_MARKER = b'dead-bee-procedural'
+
+
+class ProviderStats:
+    """Call counts and recent latencies for one provider."""
+
+    def __init__(self, window=500):
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self.calls = 0
+        self.successes = 0
+        self.failures = 0
+        self.late = 0
+        self.skipped = 0
+
+    def record(self, seconds, ok, late=False):
+        with self._lock:
+            self.calls += 1
+            if ok:
+                self.successes += 1
+            else:
+                self.failures += 1
+            if late:
+                self.late += 1
+            self._latencies.append(seconds)
+
+    def skip(self):
+        with self._lock:
+            self.skipped += 1
+
+    def snapshot(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            calls, successes, failures, late = self.calls, self.successes, self.failures, self.late
+            skipped = self.skipped
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 3)
+
+        return {
+            'calls': calls,
+            'successes': successes,
+            'failures': failures,
+            'missed_deadline': late,
+            'skipped_busy': skipped,
+            'success_rate': round(successes / calls, 3) if calls else None,
+            'p50_seconds': percentile(0.5),
+            'p95_seconds': percentile(0.95),
+        }
+
+
+class StabilityProvider:
+    name = 'stability'
+
+    def __init__(self, generate=None):
+        if generate is None:
+            from utils import generate_dead_bee_image as generate
+        self._generate = generate
+
+    def generate(self, prompt):
+        return self._generate(prompt)
+
+
+class ProceduralBeeProvider:
+    """Draws a small bee on its back, colored from a hash of the prompt."""
+    name = 'procedural'
+
+    def __init__(self, size=128):
+        self.size = size
+
+    def generate(self, prompt):
+        try:
+            return base64.b64encode(procedural_bee_png(prompt, self.size)).decode('ascii'), None
+        except Exception as e:
+            return None, f"Procedural image failed: {str(e)}"
+
+
+def _png_chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+
+def encode_png(width, height, rows):
+    """Encode 8-bit RGB ``rows`` (one bytes object per scanline) as a PNG."""
+    raw = b''.join(b'\x00' + row for row in rows)
+    return b''.join((
+        b'\x89PNG\r\n\x1a\n',
+        _png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)),
+        _png_chunk(b'tEXt', b'Software\x00' + PROCEDURAL_MARKER),
+        _png_chunk(b'IDAT', zlib.compress(raw, 6)),
+        _png_chunk(b'IEND', b''),
+    ))
+
+
+def is_procedural(png):
+    # The marker chunk directly follows IHDR, so it ends within the first 80 bytes.
+    return PROCEDURAL_MARKER in png[:80]
+
+
+def procedural_bee_png(prompt, size=128):
+    digest = hashlib.sha256(prompt.encode('utf-8')).digest()
+    background = bytes(160 + b % 80 for b in digest[:3])
+    yellow, black, wing = b'\xf2\xc0\x1c', b'\x1e\x1a\x14', b'\xdd\xe8\xf0'
+    tilt = (digest[3] / 255 - 0.5) * 0.8
+    cos_t, sin_t = math.cos(tilt), math.sin(tilt)
+    c = size / 2
+    body_a, body_b = size * 0.30, size * 0.17
+    stripe = size * 0.09
+
+    rows = []
+    for y in range(size):
+        row = bytearray(background * size)
+        for x in range(size):
+            # Coordinates in the bee's frame: u along the body, v across it.
+            dx, dy = x - c, y - c
+            u, v = dx * cos_t + dy * sin_t, -dx * sin_t + dy * cos_t
+            color = None
+            if (u / body_a) ** 2 + (v / body_b) ** 2 <= 1:
+                color = black if int((u + body_a) / stripe) % 2 else yellow
+            elif (u + body_a) ** 2 + v ** 2 <= (size * 0.11) ** 2:
+                color = black  # head
+            elif v > 0 and ((u - size * 0.05) / (size * 0.16)) ** 2 + ((v - body_b) / (size * 0.09)) ** 2 <= 1:
+                color = wing
+            elif -body_b - size * 0.14 < v < -body_b * 0.6 and any(abs(u - k * size) < 1.2 for k in (-0.12, 0, 0.12)):
+                color = black  # legs in the air
+            if color is not None:
+                row[3 * x:3 * x + 3] = color
+        rows.append(bytes(row))
+    return encode_png(size, size, rows)
+
+
+class ImageResult:
+    __slots__ = ('image_data', 'provider', 'pending')
+
+    def __init__(self, image_data, provider, pending=False):
+        self.image_data = image_data
+        self.provider = provider
+        self.pending = pending
+
+
+class LateImage:
+    """Hands a late image to its consumer, whichever of the two turns up first.
+
+    The provider may answer before the post that will hold the image has been
+    saved, so ``deliver`` keeps the image until ``claim`` names its target.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._image = None
+        self._target = None
+
+    def deliver(self, image_data):
+        with self._lock:
+            target = self._target
+            if target is None:
+                self._image = image_data
+        if target is not None:
+            target(image_data)
+
+    def claim(self, target):
+        with self._lock:
+            image_data, self._image = self._image, None
+            if image_data is None:
+                self._target = target
+        if image_data is not None:
+            target(image_data)
+
+
+class ImageGenerator:
+    def __init__(self, primary, fallback=None, deadline=8.0, max_workers=4):
+        self.primary = primary
+        self.fallback = fallback or ProceduralBeeProvider()
+        self.deadline = deadline
+        self.stats = {provider.name: ProviderStats() for provider in (self.primary, self.fallback)}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='image-provider')
+        # One per worker, held until the call finishes, so nothing ever queues behind a hung call.
+        self._workers = threading.BoundedSemaphore(max_workers)
+
+    @classmethod
+    def from_config(cls, config, primary, prefix='IMAGE_PROVIDER'):
+        return cls(primary,
+                   deadline=config.get(f'{prefix}_DEADLINE', 8.0),
+                   max_workers=config.get(f'{prefix}_WORKERS', 4))
+
+    def _timed(self, provider, prompt):
+        start = time.monotonic()
+        try:
+            image_data, error = provider.generate(prompt)
+        except Exception as e:
+            image_data, error = None, f"Unexpected error: {str(e)}"
+        return image_data, error, time.monotonic() - start
+
+    def generate(self, prompt, on_late_image=None, on_done=None):
+        """Return an ``ImageResult`` within roughly ``deadline`` seconds.
+
+        ``on_late_image(image_data)`` is called from a worker thread if the
+        primary provider succeeds after the deadline has passed. ``on_done()``
+        is called once the primary call has finished, on time or late, or at
+        once if every worker was busy and it was not made at all.
+        """
+        if not self._workers.acquire(blocking=False):
+            logger.warning(f"All {self.primary.name} workers are busy; using {self.fallback.name}")
+            self.stats[self.primary.name].skip()
+            if on_done is not None:
+                on_done()
+            return self._fallback(prompt, pending=False)
+
+        future = self._executor.submit(self._timed, self.primary, prompt)
+        future.add_done_callback(lambda done: self._finished(on_done))
+        timed_out = False
+        try:
+            image_data, error, seconds = future.result(timeout=self.deadline)
+        except TimeoutError:
+            timed_out = True
+            logger.warning(f"{self.primary.name} missed the {self.deadline}s image deadline; using {self.fallback.name}")
+            future.add_done_callback(lambda done: self._late(done, on_late_image))
+        else:
+            self.stats[self.primary.name].record(seconds, error is None)
+            if error is None:
+                return ImageResult(image_data, self.primary.name)
+            logger.error(f"{self.primary.name} failed: {error}; using {self.fallback.name}")
+        return self._fallback(prompt, pending=timed_out)
+
+    def _fallback(self, prompt, pending):
+        image_data, error, seconds = self._timed(self.fallback, prompt)
+        self.stats[self.fallback.name].record(seconds, error is None)
+        if error:
+            logger.error(f"{self.fallback.name} failed: {error}")
+        return ImageResult(image_data, self.fallback.name if error is None else None, pending=pending)
+
+    def _finished(self, on_done):
+        self._workers.release()
+        if on_done is not None:
+            try:
+                on_done()
+            except Exception as e:
+                logger.error(f"Image provider completion callback failed: {str(e)}")
+
+    def _late(self, future, on_late_image):
+        image_data, error, seconds = future.result()
+        self.stats[self.primary.name].record(seconds, error is None, late=True)
+        if error is not None:
+            logger.error(f"{self.primary.name} failed after the deadline: {error}")
+            return
+        if on_late_image is not None:
+            try:
+                on_late_image(image_data)
+            except Exception as e:
+                logger.error(f"Backfilling a late image failed: {str(e)}")
+
+    def stats_snapshot(self):
+        return {name: stats.snapshot() for name, stats in self.stats.items()}
@@ -0,0 +1,369 @@
+"""Route-level index advisor.
+
+Seeds a database, requests every GET route, EXPLAINs each SELECT the route
+issued and reports full scans and sorts on large tables together with the index
+that would avoid them. With --write-migration the suggestions become an Alembic
+revision in migrations/versions.
+
+    python index_advisor.py [--min-rows 500] [--write-migration]
+    python index_advisor.py --database-url URL --use-existing-database
+
+Uses EXPLAIN QUERY PLAN on SQLite and EXPLAIN (ANALYZE, FORMAT JSON) on
+PostgreSQL. By default it seeds a throwaway SQLite file. An existing database
+(DATABASE_URL is never picked up implicitly) is only used with
+--use-existing-database, and then as it is: no tables are created and nothing
+is seeded, though the routes it requests may still write (e.g. cached profile
+summaries), so prefer a copy over production.
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import tempfile
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+from flask import url_for
+from sqlalchemy.sql import operators, visitors
+
+from config import Config
+from main import create_app
+from models import db, User, Post, Comment, Category, Notification, followers, post_categories
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations', 'versions')
+
+# Values for URL converters and query strings the routes need to do real work.
+SAMPLE_QUERY_ARGS = {
+    'search': {'query': 'bee'},
+    'autocomplete': {'q': 'be'},
+}
+
+FILTER_OPERATORS = {operators.eq, operators.lt, operators.le, operators.gt, operators.ge, operators.in_op}
+
+SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS (\w+))?$')
+
+
+def seed(users=200, posts=2000, comments=6000, categories=20, follows=2000, notifications=2000):
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    db.session.execute(sa.insert(User), [
+        {'username': f'bee{i}', 'email': f'bee{i}@example.com', 'bio': 'buzz'} for i in range(users)])
+    db.session.execute(sa.insert(Category), [{'name': f'category{i}'} for i in range(categories)])
+    db.session.execute(sa.insert(Post), [
+        {'content': f'dead bee number {i}', 'user_id': rng.randint(1, users),
+         'timestamp': now - timedelta(minutes=rng.randint(0, 60 * 24 * 90))} for i in range(posts)])
+    db.session.execute(sa.insert(Comment), [
+        {'content': 'rip', 'user_id': rng.randint(1, users), 'post_id': rng.randint(1, posts),
+         'timestamp': now - timedelta(minutes=rng.randint(0, 60 * 24 * 90))} for _ in range(comments)])
+    db.session.execute(sa.insert(post_categories), [
+        {'post_id': post_id, 'category_id': category_id}
+        for post_id in range(1, posts + 1)
+        for category_id in rng.sample(range(1, categories + 1), 2)])
+    pairs = {(rng.randint(1, users), rng.randint(1, users)) for _ in range(follows)}
+    db.session.execute(sa.insert(followers), [
+        {'follower_id': a, 'followed_id': b} for a, b in pairs if a != b])
+    db.session.execute(sa.insert(Notification), [
+        {'user_id': rng.randint(1, users), 'message': 'someone buzzed you'} for _ in range(notifications)])
+    db.session.commit()
+
+
+def sample_url_values(arguments):
+    samples = {'username': 'bee1', 'category_id': 1, 'post_id': 1, 'user_id': 1, 'message_id': 1}
+    return {name: samples.get(name, 1) for name in arguments}
+
+
+class QueryRecorder:
+    """Collects every SELECT an engine runs, with the statement object that produced it."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.route = None
+        self.queries = []
+        sa.event.listen(engine, 'before_execute', self._before_execute)
+        sa.event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+
+    def _before_execute(self, conn, clauseelement, multiparams, params, execution_options):
+        conn.info['advisor_clause'] = clauseelement
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self.route and not executemany and statement.lstrip().upper().startswith('SELECT'):
+            self.queries.append((self.route, statement, parameters, conn.info.pop('advisor_clause', None)))
+
+    def remove(self):
+        sa.event.remove(self.engine, 'before_execute', self._before_execute)
+        sa.event.remove(self.engine, 'before_cursor_execute', self._before_cursor_execute)
+
+
+def referenced_columns(clause):
+    """Columns per table name that the statement filters, joins and orders on."""
+    columns = {'equality': defaultdict(list), 'range': defaultdict(list),
+               'join': defaultdict(list), 'order': defaultdict(list)}
+    if not isinstance(clause, sa.sql.Select):
+        return columns
+
+    def add(bucket, column):
+        table = getattr(column, 'table', None)
+        table = getattr(table, 'element', table)  # unwrap aliases
+        if isinstance(table, sa.Table) and column.name not in columns[bucket][table.name]:
+            columns[bucket][table.name].append(column.name)
+
+    conditions = [clause.whereclause] if clause.whereclause is not None else []
+    for from_clause in clause.get_final_froms():
+        for join in visitors.iterate(from_clause):
+            if isinstance(join, sa.sql.selectable.Join):
+                conditions.append(join.onclause)
+    for condition in conditions:
+        for element in visitors.iterate(condition):
+            if not isinstance(element, sa.sql.elements.BinaryExpression) or element.operator not in FILTER_OPERATORS:
+                continue
+            sides = [side for side in (element.left, element.right) if isinstance(side, sa.sql.elements.ColumnClause)]
+            if len(sides) == 2:
+                bucket = 'join'
+            elif element.operator in (operators.eq, operators.in_op):
+                bucket = 'equality'
+            else:
+                bucket = 'range'
+            for side in sides:
+                add(bucket, side)
+    for order in clause._order_by_clauses:
+        for element in visitors.iterate(order):
+            if isinstance(element, sa.sql.elements.ColumnClause):
+                add('order', element)
+    return columns
+
+
+def explain(connection, statement, parameters):
+    """Return [(kind, table)] problems, where kind is 'scan' or 'sort' and table may be None."""
+    problems = []
+    if connection.dialect.name == 'sqlite':
+        for row in connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters):
+            detail = row[-1]
+            match = SQLITE_SCAN.match(detail)
+            if match:
+                problems.append(('scan', match.group(1)))
+            elif 'USE TEMP B-TREE FOR' in detail:
+                problems.append(('sort', None))
+    elif connection.dialect.name == 'postgresql':
+        plan = connection.exec_driver_sql(f'EXPLAIN (ANALYZE, FORMAT JSON) {statement}', parameters).scalar()
+        stack = [plan[0]['Plan']]
+        while stack:
+            node = stack.pop()
+            if node['Node Type'] == 'Seq Scan':
+                problems.append(('scan', node['Relation Name']))
+            elif node['Node Type'] in ('Sort', 'Incremental Sort'):
+                problems.append(('sort', None))
+            stack.extend(node.get('Plans', []))
+    else:
+        raise SystemExit(f'Unsupported dialect: {connection.dialect.name}')
+    return problems
+
+
+def existing_index_prefixes(table):
+    prefixes = [tuple(column.name for column in table.primary_key.columns)]
+    for index in table.indexes:
+        prefixes.append(tuple(column.name for column in index.columns))
+    for constraint in table.constraints:
+        if isinstance(constraint, sa.UniqueConstraint):
+            prefixes.append(tuple(column.name for column in constraint.columns))
+    return [prefix for prefix in prefixes if prefix]
+
+
+def is_covered(table, columns):
+    return any(prefix[:len(columns)] == tuple(columns) for prefix in existing_index_prefixes(table))
+
+
+def suggest(table_name, kind, columns):
+    """Index columns that let ``table_name`` be searched (or read in order) without a scan (or sort).
+
+    Equality columns go first, then join and range columns for scans, then the
+    ORDER BY columns so rows come out of the index already sorted.
+    """
+    if kind == 'sort':
+        if not columns['order'].get(table_name):
+            return None
+        groups = ['equality', 'order']
+    else:
+        groups = ['equality', 'join', 'range', 'order']
+    suggested = []
+    for group in groups:
+        suggested += [column for column in columns[group].get(table_name, []) if column not in suggested]
+    return tuple(suggested) or None
+
+
+def analyse(app, min_rows):
+    engine = db.engine
+    recorder = QueryRecorder(engine)
+    client = app.test_client()
+    statuses = {}
+    try:
+        for rule in app.url_map.iter_rules():
+            if 'GET' not in rule.methods or rule.endpoint == 'static':
+                continue
+            with app.test_request_context():
+                path = url_for(rule.endpoint, **sample_url_values(rule.arguments), **SAMPLE_QUERY_ARGS.get(rule.endpoint, {}))
+            recorder.route = rule.endpoint
+            statuses[rule.endpoint] = (path, client.get(path).status_code)
+            recorder.route = None
+    finally:
+        recorder.remove()
+
+    metadata_tables = db.metadata.tables
+    with engine.connect() as connection:
+        row_counts = {name: connection.execute(sa.select(sa.func.count()).select_from(table)).scalar()
+                      for name, table in metadata_tables.items()}
+        findings = []
+        seen = set()
+        for route, statement, parameters, clause in recorder.queries:
+            if (route, statement) in seen:
+                continue
+            seen.add((route, statement))
+            columns = referenced_columns(clause)
+            for kind, table_name in explain(connection, statement, parameters):
+                candidates = [table_name] if table_name else list(columns['order'])
+                for name in candidates:
+                    if name not in metadata_tables or row_counts.get(name, 0) < min_rows:
+                        continue
+                    suggested = suggest(name, kind, columns)
+                    if suggested and is_covered(metadata_tables[name], suggested):
+                        suggested = None
+                    findings.append({'route': route, 'kind': kind, 'table': name, 'rows': row_counts[name],
+                                     'columns': suggested, 'statement': shorten(statement)})
+    return statuses, findings
+
+
+def shorten(statement):
+    statement = ' '.join(statement.split())
+    return re.sub(r'^SELECT .+? FROM ', 'SELECT ... FROM ', statement)
+
+
+def report(statuses, findings):
+    print('Routes exercised:')
+    for endpoint, (path, status) in sorted(statuses.items()):
+        print(f'  {status}  {endpoint:<16} {path}')
+
+    print()
+    if not findings:
+        print('No sequential scans or sorts on large tables.')
+        return {}
+
+    by_route = defaultdict(list)
+    for finding in findings:
+        by_route[finding['route']].append(finding)
+    for route, route_findings in sorted(by_route.items()):
+        print(f'{route}:')
+        for finding in route_findings:
+            what = 'full scan of' if finding['kind'] == 'scan' else 'sort on'
+            fix = f"index ({', '.join(finding['columns'])})" if finding['columns'] else 'no index suggestion'
+            print(f"  {what} {finding['table']} ({finding['rows']} rows) -> {fix}")
+            print(f"    {finding['statement'][:200]}")
+
+    suggestions = defaultdict(set)
+    for finding in findings:
+        if finding['columns']:
+            suggestions[(finding['table'], finding['columns'])].add(finding['route'])
+    print()
+    print('Suggested indexes:')
+    for (table, columns), routes in sorted(suggestions.items()):
+        print(f"  {index_name(table, columns)} ON {table} ({', '.join(columns)})  used by: {', '.join(sorted(routes))}")
+    return suggestions
+
+
+def index_name(table, columns):
+    return f"ix_{table}_{'_'.join(columns)}"
+
+
+def current_head():
+    revisions, parents = set(), set()
+    for filename in os.listdir(MIGRATIONS_DIR):
+        if not filename.endswith('.py'):
+            continue
+        with open(os.path.join(MIGRATIONS_DIR, filename)) as f:
+            source = f.read()
+        revision = re.search(r"^revision = '(\w+)'", source, re.M)
+        down = re.search(r"^down_revision = '(\w+)'", source, re.M)
+        if revision:
+            revisions.add(revision.group(1))
+        if down:
+            parents.add(down.group(1))
+    heads = revisions - parents
+    if len(heads) != 1:
+        raise SystemExit(f'Expected one migration head, found: {sorted(heads)}')
+    return heads.pop()
+
+
+def write_migration(suggestions):
+    revision = uuid.uuid4().hex[:12]
+    down_revision = current_head()
+    upgrades, downgrades = [], []
+    for table, columns in sorted(suggestions):
+        name = index_name(table, columns)
+        upgrades.append(f"    op.create_index('{name}', '{table}', {list(columns)!r}, unique=False)")
+        downgrades.insert(0, f"    op.drop_index('{name}', table_name='{table}')")
+    source = f'''"""Add indexes suggested by index_advisor
+
+Revision ID: {revision}
+Revises: {down_revision}
+Create Date: {datetime.now()}
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '{revision}'
+down_revision = '{down_revision}'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+{chr(10).join(upgrades)}
+
+
+def downgrade():
+{chr(10).join(downgrades)}
+'''
+    path = os.path.join(MIGRATIONS_DIR, f'{revision}_add_advised_indexes.py')
+    with open(path, 'w') as f:
+        f.write(source)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', help='analyse this database instead of a seeded throwaway one')
+    parser.add_argument('--use-existing-database', action='store_true',
+                        help='confirm that --database-url may be used (and written to by the routes)')
+    parser.add_argument('--min-rows', type=int, default=500, help='ignore tables smaller than this')
+    parser.add_argument('--write-migration', action='store_true')
+    args = parser.parse_args()
+
+    database_url = args.database_url
+    throwaway = not database_url
+    if throwaway:
+        database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'index_advisor.db')}"
+    elif not args.use_existing_database:
+        parser.error('--database-url needs --use-existing-database; without it a throwaway SQLite database is seeded')
+
+    class AdvisorConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_url
+        SQLALCHEMY_BINDS = {}
+        WTF_CSRF_ENABLED = False
+
+    app = create_app(AdvisorConfig)
+    with app.app_context():
+        if throwaway:
+            db.create_all()
+            seed()
+        statuses, findings = analyse(app, args.min_rows)
+        suggestions = report(statuses, findings)
+    if args.write_migration and suggestions:
+        print(f'\nWrote {write_migration(suggestions)}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,50 @@
+"""Logging setup shared by main.py, app.py and utils.py.
+
+LOG_LEVEL (default INFO) replaces the hardcoded DEBUG level, and ``truncate``
+caps what a log line may carry: image payloads and API responses are
+summarized instead of being formatted in full on every request. Pass a
+``Truncated`` as a ``%s`` argument to do that only if the record is emitted.
+"""
+import logging
+import os
+import reprlib
+
+LOG_PAYLOAD_LIMIT = int(os.environ.get('LOG_PAYLOAD_LIMIT', 500))
+
+_repr = reprlib.Repr()
+_repr.maxstring = 80
+_repr.maxother = 80
+_repr.maxlevel = 4
+_repr.maxdict = _repr.maxlist = 20
+
+
+def configure_logging():
+    logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
+
+
+def truncate(value, limit=LOG_PAYLOAD_LIMIT):
+    """A log-safe rendering of ``value`` of at most about ``limit`` characters.
+
+    Strings and bytes are cut; containers are rendered with reprlib, so long
+    values inside them (base64 images) are elided without being copied whole.
+    """
+    if isinstance(value, (bytes, bytearray)):
+        suffix = f'... ({len(value)} bytes)' if len(value) > limit else ''
+        return bytes(value[:limit]).decode('utf-8', 'replace') + suffix
+    if not isinstance(value, str):
+        value = _repr.repr(value)
+    if len(value) > limit:
+        return f'{value[:limit]}... ({len(value)} chars)'
+    return value
+
+
+class Truncated:
+    """``truncate(value)``, computed when a log record is formatted rather than when it is made."""
+    __slots__ = ('value', 'limit')
+
+    def __init__(self, value, limit=LOG_PAYLOAD_LIMIT):
+        self.value = value
+        self.limit = limit
+
+    def __str__(self):
+        return truncate(self.value, self.limit)
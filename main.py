@@ -1,102 +1,123 @@
 import os
+import threading
 from dotenv import load_dotenv
-from flask import Flask, render_template, redirect, url_for, flash, request, jsonify
-from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
-from flask_login import LoginManager, login_user, login_required, logout_user, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
-from models import db, User, Post, Comment, Category, Notification
-from forms import RegistrationForm, LoginForm, PostForm, CommentForm, ProfileForm, CategoryForm
-from config import Config
-from utils import generate_dead_bee_image
-import logging
-from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy import or_
 
+# Before importing config, so SECRET_KEY and friends can come from .env.
 load_dotenv()
 
-app = Flask(__name__)
-app.config.from_object(Config)
+from flask import Flask
+from flask_login import LoginManager
+from sqlalchemy import text
+from werkzeug.utils import cached_property, import_string
+from models import db, migrate, User
+from config import Config
+from db_routing import init_replicas
+from sqlite_backend import init_sqlite
+from autocomplete import init_autocomplete, get_index
+from ranking import init_ranking
+from archive import init_archive
+from recommendations import init_recommendations
+from feeds import init_feeds
+from assets import init_assets
+from session_store import init_sessions
+from profiling import init_profiling
+from log_utils import configure_logging
+import profiles  # registers profile summary invalidation on Post writes
+import logging
 
-db.init_app(app)
-migrate = Migrate(app, db)
+configure_logging()
+logger = logging.getLogger(__name__)
 
-login_manager = LoginManager(app)
+login_manager = LoginManager()
 login_manager.login_view = 'login'
 
-logging.basicConfig(level=logging.DEBUG)
-logger = logging.getLogger(__name__)
+# (rule, endpoint, methods). Each endpoint resolves to views.<endpoint>, which
+# is only imported when a request first hits it.
+URL_RULES = [
+    ('/', 'index', ['GET']),
+    ('/hot', 'hot', ['GET']),
+    ('/login', 'login', ['GET', 'POST']),
+    ('/register', 'register', ['GET', 'POST']),
+    ('/profile/<username>', 'profile', ['GET', 'POST']),
+    ('/search', 'search', ['GET']),
+    ('/category/<int:category_id>', 'category_posts', ['GET']),
+    ('/profile/<username>/feed.atom', 'profile_feed', ['GET']),
+    ('/category/<int:category_id>/feed.atom', 'category_feed', ['GET']),
+    ('/post/<int:post_id>/image', 'post_image', ['GET']),
+    ('/api/autocomplete', 'autocomplete', ['GET']),
+    ('/api/who-to-follow', 'who_to_follow', ['GET']),
+]
+
+class LazyView:
+    def __init__(self, import_name):
+        self.__module__, self.__name__ = import_name.rsplit('.', 1)
+        self.import_name = import_name
+
+    @cached_property
+    def view(self):
+        return import_string(self.import_name)
+
+    def __call__(self, *args, **kwargs):
+        return self.view(*args, **kwargs)
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return db.session.get(User, int(user_id))
 
-@app.route('/')
-def index():
-    posts = Post.query.order_by(Post.timestamp.desc()).all()
-    return render_template('index.html', posts=posts)
+def create_app(config=Config):
+    app = Flask(__name__)
+    app.config.from_object(config)
 
-@app.route('/login', methods=['GET', 'POST'])
-def login():
-    if current_user.is_authenticated:
-        return redirect(url_for('index'))
-    form = LoginForm()
-    if form.validate_on_submit():
-        user = User.query.filter_by(username=form.username.data).first()
-        if user and user.check_password(form.password.data):
-            login_user(user)
-            flash('Logged in successfully.', 'success')
-            next_page = request.args.get('next')
-            return redirect(next_page or url_for('index'))
-        else:
-            flash('Invalid username or password', 'error')
-    return render_template('login.html', form=form)
+    db.init_app(app)
+    init_replicas(app, db)
+    init_sqlite(app, db)
+    migrate.init_app(app, db)
+    login_manager.init_app(app)
+    init_sessions(app)
+    init_profiling(app)
+    init_autocomplete(app)
+    init_ranking(app)
+    init_archive(app)
+    init_recommendations(app)
+    init_feeds(app)
+    init_assets(app)
 
-@app.route('/register', methods=['GET', 'POST'])
-def register():
-    if current_user.is_authenticated:
-        return redirect(url_for('index'))
-    form = RegistrationForm()
-    if form.validate_on_submit():
-        user = User(username=form.username.data, email=form.email.data)
-        user.set_password(form.password.data)
-        db.session.add(user)
-        db.session.commit()
-        flash('Congratulations, you are now a registered user!', 'success')
-        return redirect(url_for('login'))
-    return render_template('register.html', title='Register', form=form)
+    for rule, endpoint, methods in URL_RULES:
+        app.add_url_rule(rule, endpoint, LazyView(f'views.{endpoint}'), methods=methods)
 
-@app.route('/profile/<username>', methods=['GET', 'POST'])
-def profile(username):
-    user = User.query.filter_by(username=username).first_or_404()
-    form = ProfileForm()
-    if form.validate_on_submit() and current_user.is_authenticated and user == current_user:
-        user.avatar = form.avatar.data
-        user.bio = form.bio.data
-        db.session.commit()
-        flash('Your profile has been updated!', 'success')
-        return redirect(url_for('profile', username=username))
-    elif request.method == 'GET' and current_user.is_authenticated and user == current_user:
-        form.avatar.data = user.avatar
-        form.bio.data = user.bio
-    posts = Post.query.filter_by(author=user).order_by(Post.timestamp.desc()).all()
-    return render_template('profile.html', user=user, form=form, posts=posts)
+    if app.config.get('WARM_UP_ON_START'):
+        threading.Thread(target=warm_up, args=(app,), name='warm-up', daemon=True).start()
+    return app
 
-@app.route('/search')
-def search():
-    query = request.args.get('query', '')
-    users = User.query.filter(User.username.ilike(f'%{query}%')).all()
-    posts = Post.query.filter(Post.content.ilike(f'%{query}%')).all()
-    categories = Category.query.filter(Category.name.ilike(f'%{query}%')).all()
-    return render_template('search_results.html', query=query, users=users, posts=posts, categories=categories)
-
-@app.route('/category/<int:category_id>')
-def category_posts(category_id):
-    category = Category.query.get_or_404(category_id)
-    posts = Post.query.filter(Post.categories.contains(category)).order_by(Post.timestamp.desc()).all()
-    return render_template('category_posts.html', category=category, posts=posts)
+def warm_up(app):
+    """Import the views, open pooled DB connections, compile every template and
+    build the autocomplete index."""
+    with app.app_context():
+        for view in app.view_functions.values():
+            if isinstance(view, LazyView):
+                view.view
+        connections = []
+        try:
+            for _ in range(app.config.get('WARM_UP_DB_CONNECTIONS', 2)):
+                connection = db.engine.connect()
+                connection.execute(text('SELECT 1'))
+                connections.append(connection)
+        except Exception as e:
+            logger.warning(f"Warm-up could not prime the database pool: {str(e)}")
+        finally:
+            for connection in connections:
+                connection.close()
+        for name in app.jinja_env.list_templates():
+            app.jinja_env.get_template(name)
+        try:
+            get_index()
+        except Exception as e:
+            logger.warning(f"Warm-up could not build the autocomplete index: {str(e)}")
+    logger.info('Warm-up finished')
 
 if __name__ == '__main__':
+    app = create_app()
     with app.app_context():
         db.create_all()
-    app.run(host="0.0.0.0", port=5000, debug=True)
+        get_index()
+    app.run(host="0.0.0.0", port=int(os.environ.get('PORT', 5000)), debug=True)
@@ -5,6 +5,8 @@ from flask import current_app
 
 from alembic import context
 
+from sqlite_backend import FTS_TABLES
+
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
@@ -90,9 +92,15 @@ def run_migrations_online():
                 directives[:] = []
                 logger.info('No changes in schema detected.')
 
+    # The FTS5 search tables (and their shadow tables) belong to sqlite_backend.
+    def include_name(name, type_, parent_names):
+        return not (type_ == 'table' and name.startswith(tuple(FTS_TABLES.values())))
+
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    if conf_args.get("include_name") is None:
+        conf_args["include_name"] = include_name
 
     connectable = get_engine()
 
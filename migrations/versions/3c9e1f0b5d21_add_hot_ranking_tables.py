@@ -0,0 +1,40 @@
+"""Add hot ranking tables
+
+Revision ID: 3c9e1f0b5d21
+Revises: a7b4ee64012b
+Create Date: 2026-10-19 09:12:44.118204
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '3c9e1f0b5d21'
+down_revision = 'a7b4ee64012b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('post_score',
+    sa.Column('post_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['post_id'], ['post.id'], ),
+    sa.PrimaryKeyConstraint('post_id')
+    )
+    op.create_index(op.f('ix_post_score_score'), 'post_score', ['score'], unique=False)
+    ranking_epoch = op.create_table('ranking_epoch',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.bulk_insert(ranking_epoch, [{'id': 1, 'started_at': datetime.utcnow()}])
+    # Existing posts get scores from `flask --app main rebuild-hot`.
+
+
+def downgrade():
+    op.drop_table('ranking_epoch')
+    op.drop_index(op.f('ix_post_score_score'), table_name='post_score')
+    op.drop_table('post_score')
@@ -0,0 +1,58 @@
+"""Add archive tables for old posts, comments and category links
+
+Revision ID: 5d0c7a19e3b4
+Revises: f7709cf380da
+Create Date: 2026-10-19 15:12:08.413095
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '5d0c7a19e3b4'
+down_revision = 'f7709cf380da'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('archived_post',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('content', sa.String(length=500), nullable=False),
+    sa.Column('image_url', sa.Text(), nullable=True),
+    sa.Column('timestamp', sa.DateTime(), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('archived_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_archived_post_timestamp'), 'archived_post', ['timestamp'], unique=False)
+    op.create_index('ix_archived_post_user_id_timestamp', 'archived_post', ['user_id', 'timestamp'], unique=False)
+    op.create_table('archived_comment',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('content', sa.String(length=200), nullable=False),
+    sa.Column('timestamp', sa.DateTime(), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('post_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['post_id'], ['archived_post.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_archived_comment_post_id'), 'archived_comment', ['post_id'], unique=False)
+    op.create_table('archived_post_categories',
+    sa.Column('post_id', sa.Integer(), nullable=False),
+    sa.Column('category_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['category_id'], ['category.id'], ),
+    sa.ForeignKeyConstraint(['post_id'], ['archived_post.id'], ),
+    sa.PrimaryKeyConstraint('post_id', 'category_id')
+    )
+    # Existing old posts are moved by `flask --app main archive-posts`.
+
+
+def downgrade():
+    op.drop_table('archived_post_categories')
+    op.drop_index(op.f('ix_archived_comment_post_id'), table_name='archived_comment')
+    op.drop_table('archived_comment')
+    op.drop_index('ix_archived_post_user_id_timestamp', table_name='archived_post')
+    op.drop_index(op.f('ix_archived_post_timestamp'), table_name='archived_post')
+    op.drop_table('archived_post')
@@ -0,0 +1,33 @@
+"""Add profile summary table and post (user_id, timestamp) index
+
+Revision ID: 8f2d4a6c1e07
+Revises: 3c9e1f0b5d21
+Create Date: 2026-10-19 10:03:27.551930
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '8f2d4a6c1e07'
+down_revision = '3c9e1f0b5d21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('profile_summary',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('post_count', sa.Integer(), nullable=False),
+    sa.Column('follower_count', sa.Integer(), nullable=False),
+    sa.Column('following_count', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    op.create_index('ix_post_user_id_timestamp', 'post', ['user_id', 'timestamp'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_post_user_id_timestamp', table_name='post')
+    op.drop_table('profile_summary')
@@ -0,0 +1,42 @@
+"""Add follow recommendation and recommendation dirty-set tables
+
+Revision ID: b2e6f4d8a913
+Revises: 5d0c7a19e3b4
+Create Date: 2026-10-19 16:40:51.902274
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'b2e6f4d8a913'
+down_revision = '5d0c7a19e3b4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('follow_recommendation',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('recommended_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.Column('mutual_count', sa.Integer(), nullable=False),
+    sa.Column('computed_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['recommended_id'], ['user.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'recommended_id')
+    )
+    op.create_index('ix_follow_recommendation_user_id_score', 'follow_recommendation', ['user_id', 'score'], unique=False)
+    op.create_table('recommendation_dirty',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('marked_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    # Populate with `flask --app main recommend-follows --full`.
+
+
+def downgrade():
+    op.drop_table('recommendation_dirty')
+    op.drop_index('ix_follow_recommendation_user_id_score', table_name='follow_recommendation')
+    op.drop_table('follow_recommendation')
@@ -0,0 +1,27 @@
+"""Add version and stale to profile_summary
+
+Revision ID: c4a8e2f6b1d7
+Revises: b2e6f4d8a913
+Create Date: 2026-10-19 18:05:12.417305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'c4a8e2f6b1d7'
+down_revision = 'b2e6f4d8a913'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('profile_summary', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('stale', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('profile_summary', schema=None) as batch_op:
+        batch_op.drop_column('stale')
+        batch_op.drop_column('version')
@@ -0,0 +1,54 @@
+"""Make post and comment ids AUTOINCREMENT on SQLite
+
+Revision ID: d9f3b7a2c5e8
+Revises: c4a8e2f6b1d7
+Create Date: 2026-10-19 18:41:37.208164
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'd9f3b7a2c5e8'
+down_revision = 'c4a8e2f6b1d7'
+branch_labels = None
+depends_on = None
+
+TABLES = (('post', 'archived_post'), ('comment', 'archived_comment'))
+
+
+def upgrade():
+    # Sequences elsewhere never hand out an id twice; SQLite reuses the highest
+    # rowid unless the table is AUTOINCREMENT, which needs a rebuild.
+    bind = op.get_bind()
+    if bind.dialect.name != 'sqlite':
+        return
+    for table, archived in TABLES:
+        with op.batch_alter_table(table, recreate='always', table_kwargs={'sqlite_autoincrement': True}):
+            pass
+        # Start past every id used so far, including ones now only in the archive.
+        floor = bind.scalar(sa.text(f'SELECT max(coalesce((SELECT max(id) FROM {table}), 0), '
+                                    f'coalesce((SELECT max(id) FROM {archived}), 0))'))
+        bind.execute(sa.text('DELETE FROM sqlite_sequence WHERE name = :name'), {'name': table})
+        bind.execute(sa.text('INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)'),
+                     {'name': table, 'seq': floor})
+        # Hot rows that already reused an archived id get a fresh one.
+        collisions = bind.scalars(sa.text(f'SELECT id FROM {table} WHERE id IN (SELECT id FROM {archived})')).all()
+        for old_id in collisions:
+            floor += 1
+            bind.execute(sa.text(f'UPDATE {table} SET id = :new WHERE id = :old'), {'new': floor, 'old': old_id})
+            if table == 'post':
+                for child in ('comment', 'post_categories', 'post_score'):
+                    bind.execute(sa.text(f'UPDATE {child} SET post_id = :new WHERE post_id = :old'),
+                                 {'new': floor, 'old': old_id})
+        if collisions:
+            bind.execute(sa.text('UPDATE sqlite_sequence SET seq = :seq WHERE name = :name'),
+                         {'name': table, 'seq': floor})
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for table, _ in TABLES:
+        with op.batch_alter_table(table, recreate='always', table_kwargs={'sqlite_autoincrement': False}):
+            pass
@@ -0,0 +1,32 @@
+"""Add indexes suggested by index_advisor
+
+Revision ID: f7709cf380da
+Revises: 8f2d4a6c1e07
+Create Date: 2026-10-19 13:02:45.247737
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'f7709cf380da'
+down_revision = '8f2d4a6c1e07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_comment_post_id', 'comment', ['post_id'], unique=False)
+    op.create_index('ix_followers_followed_id', 'followers', ['followed_id'], unique=False)
+    op.create_index('ix_followers_follower_id', 'followers', ['follower_id'], unique=False)
+    op.create_index('ix_post_timestamp', 'post', ['timestamp'], unique=False)
+    # Not reachable from a GET route yet, so added by hand rather than by the advisor.
+    op.create_index('ix_notification_user_id', 'notification', ['user_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_notification_user_id', table_name='notification')
+    op.drop_index('ix_post_timestamp', table_name='post')
+    op.drop_index('ix_followers_follower_id', table_name='followers')
+    op.drop_index('ix_followers_followed_id', table_name='followers')
+    op.drop_index('ix_comment_post_id', table_name='comment')
@@ -3,13 +3,14 @@ from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 from flask_migrate import Migrate
+from db_routing import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
 
 followers = db.Table('followers',
-    db.Column('follower_id', db.Integer, db.ForeignKey('user.id')),
-    db.Column('followed_id', db.Integer, db.ForeignKey('user.id'))
+    db.Column('follower_id', db.Integer, db.ForeignKey('user.id'), index=True),
+    db.Column('followed_id', db.Integer, db.ForeignKey('user.id'), index=True)
 )
 
 class User(UserMixin, db.Model):
@@ -36,10 +37,14 @@ class User(UserMixin, db.Model):
     def follow(self, user):
         if not self.is_following(user):
             self.followed.append(user)
+            ProfileSummary.invalidate(self.id, user.id)
+            RecommendationDirty.mark(self.id)
 
     def unfollow(self, user):
         if self.is_following(user):
             self.followed.remove(user)
+            ProfileSummary.invalidate(self.id, user.id)
+            RecommendationDirty.mark(self.id)
 
     def is_following(self, user):
         return self.followed.filter(followers.c.followed_id == user.id).count() > 0
@@ -53,22 +58,73 @@ class Post(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.String(500), nullable=False)
     image_url = db.Column(db.Text, nullable=True)  # Changed to Text and nullable=True
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     comments = db.relationship('Comment', backref='post', lazy=True)
     categories = db.relationship('Category', secondary='post_categories', back_populates='posts')
+    # AUTOINCREMENT: SQLite would otherwise reuse the highest id once the archive
+    # job moves that row out, colliding with its archived copy.
+    __table_args__ = (db.Index('ix_post_user_id_timestamp', 'user_id', 'timestamp'), {'sqlite_autoincrement': True})
+
+class ProfileSummary(db.Model):
+    # Cached profile header counts, rebuilt by profiles.py on read. Writes mark the
+    # row stale and bump ``version`` after they commit; a rebuild is stored only if
+    # the version it counted under is still current.
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    post_count = db.Column(db.Integer, nullable=False, default=0)
+    follower_count = db.Column(db.Integer, nullable=False, default=0)
+    following_count = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    stale = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+
+    @classmethod
+    def invalidate(cls, *user_ids):
+        db.session.info.setdefault('stale_profile_summaries', set()).update(user_ids)
+
+class PostScore(db.Model):
+    # Time-decayed engagement score relative to RankingEpoch; maintained by ranking.py.
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), primary_key=True)
+    score = db.Column(db.Float, nullable=False, default=0.0, index=True)
+
+class RankingEpoch(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    started_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class FollowRecommendation(db.Model):
+    # Top-K "who to follow" per user, written by recommendations.py's batch job.
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    recommended_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    score = db.Column(db.Float, nullable=False)
+    mutual_count = db.Column(db.Integer, nullable=False)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (db.Index('ix_follow_recommendation_user_id_score', 'user_id', 'score'),)
+
+class RecommendationDirty(db.Model):
+    # Users who followed or unfollowed someone since the last recommendation run.
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    marked_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    @classmethod
+    def mark(cls, user_id):
+        dirty = db.session.get(cls, user_id)
+        if dirty is None:
+            db.session.add(cls(user_id=user_id, marked_at=datetime.utcnow()))
+        else:
+            dirty.marked_at = datetime.utcnow()
 
 class Comment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.String(200), nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), nullable=False)
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), nullable=False, index=True)
     author = db.relationship('User', backref='comments')
+    __table_args__ = {'sqlite_autoincrement': True}  # see Post
 
 class Notification(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     message = db.Column(db.String(200), nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     is_read = db.Column(db.Boolean, default=False)
@@ -77,3 +133,26 @@ post_categories = db.Table('post_categories',
     db.Column('post_id', db.Integer, db.ForeignKey('post.id'), primary_key=True),
     db.Column('category_id', db.Integer, db.ForeignKey('category.id'), primary_key=True)
 )
+
+# Cold storage for posts older than ARCHIVE_AFTER_DAYS, moved by archive.py with
+# their comments and categories. Rows keep their original ids.
+class ArchivedPost(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    content = db.Column(db.String(500), nullable=False)
+    image_url = db.Column(db.Text, nullable=True)
+    timestamp = db.Column(db.DateTime, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (db.Index('ix_archived_post_user_id_timestamp', 'user_id', 'timestamp'),)
+
+class ArchivedComment(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    content = db.Column(db.String(200), nullable=False)
+    timestamp = db.Column(db.DateTime)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    post_id = db.Column(db.Integer, db.ForeignKey('archived_post.id'), nullable=False, index=True)
+
+archived_post_categories = db.Table('archived_post_categories',
+    db.Column('post_id', db.Integer, db.ForeignKey('archived_post.id'), primary_key=True),
+    db.Column('category_id', db.Integer, db.ForeignKey('category.id'), primary_key=True)
+)
@@ -0,0 +1,122 @@
+import logging
+from datetime import datetime
+
+import sqlalchemy as sa
+from sqlalchemy.exc import IntegrityError
+
+from db_routing import RoutingSession, use_primary
+from models import db, Post, ArchivedPost, ProfileSummary, followers
+from read_models import HOT, ARCHIVE, post_rows, post_rows_query
+from sqlite_backend import holds_write_lock
+
+logger = logging.getLogger(__name__)
+
+
+def parse_cursor(before, before_id):
+    """Turn the ``before``/``before_id`` query args into a (timestamp, id) cursor, or None.
+
+    Raises ValueError for a malformed ``before``.
+    """
+    if not before or before_id is None:
+        return None
+    return datetime.fromisoformat(before), before_id
+
+
+def _profile_page_query(tables, user_id, cursor, limit):
+    post = tables.post
+    query = post_rows_query(tables).where(post.user_id == user_id)
+    if cursor is not None:
+        timestamp, post_id = cursor
+        query = query.where(sa.or_(
+            post.timestamp < timestamp,
+            sa.and_(post.timestamp == timestamp, post.id < post_id),
+        ))
+    return query.order_by(post.timestamp.desc(), post.id.desc()).limit(limit)
+
+
+def profile_posts_page(user_id, cursor=None, per_page=20):
+    """One page of a user's posts, newest first, read off ix_post_user_id_timestamp.
+
+    Pages that run past the user's hot posts continue into the archive with the
+    same cursor. Returns ``(posts, next_cursor)``; ``next_cursor`` is None on the
+    last page.
+    """
+    posts = post_rows(_profile_page_query(HOT, user_id, cursor, per_page + 1), categories=False)
+    if len(posts) <= per_page:
+        posts += post_rows(_profile_page_query(ARCHIVE, user_id, cursor, per_page + 1 - len(posts)),
+                           categories=False, tables=ARCHIVE)
+    if len(posts) > per_page:
+        posts = posts[:per_page]
+        return posts, (posts[-1].timestamp, posts[-1].id)
+    return posts, None
+
+
+def _count(executor, user_id):
+    count = lambda table, where: executor.scalar(sa.select(sa.func.count()).select_from(table).where(where))
+    return {
+        'post_count': sum(count(model, model.user_id == user_id) for model in (Post, ArchivedPost)),
+        'follower_count': count(followers, followers.c.followed_id == user_id),
+        'following_count': count(followers, followers.c.follower_id == user_id),
+    }
+
+
+def get_profile_summary(user_id):
+    summary = db.session.get(ProfileSummary, user_id)
+    if summary is not None and not summary.stale:
+        return summary
+
+    now = datetime.utcnow()
+    # On SQLite a write request's session already holds the only write lock, so
+    # the row can't be stored from another connection; just count.
+    if holds_write_lock():
+        with use_primary(db):
+            return ProfileSummary(user_id=user_id, updated_at=now, **_count(db.session, user_id))
+
+    # Rebuilt on connections of its own, so the request's session (and the
+    # objects it has loaded) is not committed and expired just to fill a cache,
+    # and on the primary: the row outlives this request, so counts from a lagging
+    # replica would stick.
+    summaries = ProfileSummary.__table__
+    if summary is None:
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(sa.insert(summaries).values(user_id=user_id, stale=True, version=0))
+        except IntegrityError:
+            pass  # another request got there first
+    with db.engine.connect() as connection:
+        version = connection.scalar(sa.select(summaries.c.version).where(summaries.c.user_id == user_id))
+        counts = _count(connection, user_id)
+    # A write that committed after ``version`` was read has bumped it (or will
+    # mark the row stale again), so these counts are stored only if still current.
+    with db.engine.begin() as connection:
+        connection.execute(sa.update(summaries)
+                           .where(summaries.c.user_id == user_id, summaries.c.version == version)
+                           .values(stale=False, updated_at=now, **counts))
+    return ProfileSummary(user_id=user_id, version=version, stale=False, updated_at=now, **counts)
+
+
+@sa.event.listens_for(Post, 'after_insert')
+@sa.event.listens_for(Post, 'after_delete')
+def _invalidate_author_summary(mapper, connection, target):
+    sa.orm.object_session(target).info.setdefault('stale_profile_summaries', set()).add(target.user_id)
+
+
+@sa.event.listens_for(RoutingSession, 'after_commit')
+def _mark_summaries_stale(session):
+    # After commit, not inside the write's transaction: a rebuild that counted
+    # before the write was visible must find the version already moved on.
+    user_ids = session.info.pop('stale_profile_summaries', None)
+    if not user_ids:
+        return
+    summaries = ProfileSummary.__table__
+    try:
+        with db.engine.begin() as connection:
+            connection.execute(sa.update(summaries).where(summaries.c.user_id.in_(user_ids))
+                               .values(stale=True, version=summaries.c.version + 1))
+    except Exception as e:
+        logger.error(f"Could not mark profile summaries {sorted(user_ids)} stale: {str(e)}")
+
+
+@sa.event.listens_for(RoutingSession, 'after_rollback')
+def _drop_stale_summaries(session):
+    session.info.pop('stale_profile_summaries', None)
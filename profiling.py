@@ -0,0 +1,204 @@
+"""Opt-in per-request sampling profiles and a slow-request log.
+
+A request is profiled when it carries ``X-Profile: <PROFILE_TOKEN>`` or falls
+in the PROFILE_SAMPLE_RATE fraction of requests. A sampler thread then reads
+the request thread's stack every PROFILE_INTERVAL_MS and, once the response
+has been fully sent (streamed pages included), the counts are written to
+PROFILE_DIR in collapsed-stack format: one ``frame;frame;frame count`` line per
+stack, ready for flamegraph.pl or speedscope.
+
+Independently, every request's SQL is timed. Requests slower than
+SLOW_REQUEST_MS are logged to the ``slow_requests`` logger and appended to
+PROFILE_DIR/slow_requests.jsonl with their slowest statements.
+"""
+import hmac
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+import sqlalchemy as sa
+from flask import g, has_request_context, request
+from sqlalchemy.engine import Engine
+
+from log_utils import truncate
+
+logger = logging.getLogger(__name__)
+slow_logger = logging.getLogger('slow_requests')
+
+MAX_STACK_DEPTH = 128
+SLOWEST_STATEMENTS = 5
+
+
+class StackSampler:
+    """Samples one thread's Python stack on a background thread."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse(frame)] += 1
+
+
+def collapse(frame):
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class RequestProfile:
+    __slots__ = ('start', 'sampler', 'queries', 'sql_seconds', 'slowest')
+
+    def __init__(self, sampler=None):
+        self.start = time.perf_counter()
+        self.sampler = sampler
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.slowest = []
+
+    def record_sql(self, statement, seconds):
+        self.queries += 1
+        self.sql_seconds += seconds
+        self.slowest.append((seconds, statement))
+        if len(self.slowest) > SLOWEST_STATEMENTS:
+            self.slowest.sort(key=lambda item: item[0], reverse=True)
+            del self.slowest[SLOWEST_STATEMENTS:]
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and g.get('request_profile') is not None:
+        conn.info.setdefault('profile_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('profile_query_start')
+    if not starts:
+        return
+    seconds = time.perf_counter() - starts.pop()
+    if has_request_context() and g.get('request_profile') is not None:
+        g.request_profile.record_sql(statement, seconds)
+
+
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute; drop its start time
+    # so it is not paired with the next statement on this (pooled) connection.
+    starts = context.connection.info.get('profile_query_start') if context.connection is not None else None
+    if starts:
+        starts.pop()
+
+
+def _wants_profile(app):
+    token = app.config.get('PROFILE_TOKEN')
+    header = request.headers.get('X-Profile')
+    if token and header and hmac.compare_digest(header, token):
+        return True
+    rate = app.config.get('PROFILE_SAMPLE_RATE', 0)
+    return rate > 0 and random.random() < rate
+
+
+def _write_profile(directory, name, stacks):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, name)
+    with open(path, 'w') as f:
+        for stack, count in stacks.most_common():
+            f.write(f'{stack} {count}\n')
+    return path
+
+
+def _finish(app, profile, method, path, endpoint, status, profile_name):
+    elapsed_ms = (time.perf_counter() - profile.start) * 1000
+    directory = app.config.get('PROFILE_DIR') or os.path.join(app.instance_path, 'profiles')
+    if profile.sampler is not None:
+        stacks = profile.sampler.stop()
+        if stacks:
+            written = _write_profile(directory, profile_name, stacks)
+            logger.info(f"Profiled {method} {path} in {elapsed_ms:.0f}ms: {sum(stacks.values())} samples -> {written}")
+
+    threshold = app.config.get('SLOW_REQUEST_MS', 0)
+    if not threshold or elapsed_ms < threshold:
+        return
+    slowest = sorted(profile.slowest, key=lambda item: item[0], reverse=True)
+    slow_logger.warning(
+        f"Slow request {method} {path} ({endpoint}) {status} in {elapsed_ms:.0f}ms: "
+        f"{profile.queries} queries took {profile.sql_seconds * 1000:.0f}ms; slowest: "
+        + '; '.join(f'{seconds * 1000:.1f}ms {truncate(statement, 200)}' for seconds, statement in slowest[:3]))
+    entry = {
+        'at': datetime.utcnow().isoformat(),
+        'method': method,
+        'path': path,
+        'endpoint': endpoint,
+        'status': status,
+        'ms': round(elapsed_ms, 1),
+        'queries': profile.queries,
+        'sql_ms': round(profile.sql_seconds * 1000, 1),
+        'slowest': [{'ms': round(seconds * 1000, 2), 'sql': truncate(statement, 1000)} for seconds, statement in slowest],
+        'profile': profile_name if profile.sampler is not None else None,
+    }
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, 'slow_requests.jsonl'), 'a') as f:
+        f.write(json.dumps(entry) + '\n')
+
+
+def init_profiling(app):
+    if not (app.config.get('SLOW_REQUEST_MS') or app.config.get('PROFILE_TOKEN')
+            or app.config.get('PROFILE_SAMPLE_RATE')):
+        return
+    if not sa.event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        sa.event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        sa.event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        sa.event.listen(Engine, 'handle_error', _handle_error)
+
+    @app.before_request
+    def start_request_profile():
+        sampler = None
+        if _wants_profile(app):
+            interval = app.config.get('PROFILE_INTERVAL_MS', 5) / 1000
+            sampler = StackSampler(threading.get_ident(), interval).start()
+        g.request_profile = RequestProfile(sampler)
+
+    @app.after_request
+    def finish_request_profile(response):
+        profile = g.get('request_profile')
+        if profile is None:
+            return response
+        profile_name = None
+        if profile.sampler is not None:
+            profile_name = (f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{request.method}-"
+                            f"{request.endpoint or 'unknown'}.folded")
+            response.headers['X-Profile-Id'] = profile_name
+        # Streamed pages keep running SQL and rendering after this hook, so the
+        # profile is closed only once the body has been sent.
+        method, path, endpoint, status = request.method, request.path, request.endpoint, response.status_code
+        response.call_on_close(lambda: _finish(app, profile, method, path, endpoint, status, profile_name))
+        return response
+
+    @app.teardown_request
+    def stop_failed_request_profile(exc):
+        # after_request does not run for unhandled errors; don't leave the sampler running.
+        profile = g.get('request_profile')
+        if exc is not None and profile is not None and profile.sampler is not None:
+            profile.sampler.stop()
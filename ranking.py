@@ -0,0 +1,158 @@
+"""Incrementally maintained "hot" scores.
+
+Each engagement adds ``weight * 2 ** ((t - epoch) / half_life)`` to its post's
+score. Because every contribution is scaled against the same epoch, ordering by
+the stored score equals ordering by the time-decayed score, so writes only ever
+add to one row and the hot page is a range read on ``post_score.score``.
+``renormalize()`` periodically moves the epoch forward and rescales every score
+so the numbers stay small, pruning posts whose score has decayed away. It must
+run: 2 ** x overflows a float once the epoch is about 1000 half-lives old.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+import sqlalchemy as sa
+from flask import current_app
+
+from models import db, Post, Comment, PostScore, RankingEpoch
+from read_models import post_rows, post_rows_query
+
+logger = logging.getLogger(__name__)
+
+WEIGHTS = {
+    'post': 1.0,
+    'comment': 2.0,
+    'reaction': 1.0,
+}
+
+EPOCH_ID = 1
+
+
+def half_life_seconds():
+    return current_app.config.get('HOT_HALF_LIFE_HOURS', 12) * 3600
+
+
+def contribution(weight, at, epoch):
+    return weight * 2 ** ((at - epoch).total_seconds() / half_life_seconds())
+
+
+def current_epoch(connection):
+    epochs = RankingEpoch.__table__
+    row = connection.execute(
+        sa.select(epochs.c.started_at).where(epochs.c.id == EPOCH_ID).with_for_update(read=True)
+    ).first()
+    if row is None:
+        started_at = datetime.utcnow()
+        connection.execute(sa.insert(epochs).values(id=EPOCH_ID, started_at=started_at))
+        return started_at
+    return row.started_at
+
+
+def record_engagement(connection, post_id, kind, at=None):
+    """Add one ``kind`` engagement on ``post_id`` to its score, inside the caller's transaction."""
+    scores = PostScore.__table__
+    delta = contribution(WEIGHTS[kind], at or datetime.utcnow(), current_epoch(connection))
+    result = connection.execute(
+        sa.update(scores).where(scores.c.post_id == post_id).values(score=scores.c.score + delta)
+    )
+    if result.rowcount == 0:
+        connection.execute(sa.insert(scores).values(post_id=post_id, score=delta))
+
+
+@sa.event.listens_for(Post, 'after_insert')
+def _score_new_post(mapper, connection, target):
+    record_engagement(connection, target.id, 'post', target.timestamp)
+
+
+@sa.event.listens_for(Comment, 'after_insert')
+def _score_new_comment(mapper, connection, target):
+    record_engagement(connection, target.post_id, 'comment', target.timestamp)
+
+
+def hot_posts(limit):
+    return post_rows(post_rows_query()
+                     .join(PostScore, PostScore.post_id == Post.id)
+                     .order_by(PostScore.score.desc())
+                     .limit(limit),
+                     comments=True)
+
+
+def renormalize(now=None, prune_below=1e-4):
+    """Rescale every score to a new epoch at ``now`` and drop scores below ``prune_below``."""
+    now = now or datetime.utcnow()
+    epoch = db.session.execute(
+        sa.select(RankingEpoch).where(RankingEpoch.id == EPOCH_ID).with_for_update()
+    ).scalar_one_or_none()
+    if epoch is None:
+        db.session.add(RankingEpoch(id=EPOCH_ID, started_at=now))
+        db.session.commit()
+        return 0
+
+    factor = 2 ** (-(now - epoch.started_at).total_seconds() / half_life_seconds())
+    db.session.execute(sa.update(PostScore).values(score=PostScore.score * factor))
+    pruned = db.session.execute(sa.delete(PostScore).where(PostScore.score < prune_below)).rowcount
+    epoch.started_at = now
+    db.session.commit()
+    logger.info(f"Renormalized hot scores by {factor:.3g}, pruned {pruned} posts")
+    return pruned
+
+
+def rebuild(now=None):
+    """Recompute every score from posts and comments, e.g. after first deploying the table."""
+    now = now or datetime.utcnow()
+    epoch = db.session.get(RankingEpoch, EPOCH_ID)
+    if epoch is None:
+        epoch = RankingEpoch(id=EPOCH_ID)
+        db.session.add(epoch)
+    epoch.started_at = now
+
+    scores = defaultdict(float)
+    for post_id, timestamp in db.session.execute(sa.select(Post.id, Post.timestamp)):
+        scores[post_id] += contribution(WEIGHTS['post'], timestamp, now)
+    for post_id, timestamp in db.session.execute(sa.select(Comment.post_id, Comment.timestamp)):
+        scores[post_id] += contribution(WEIGHTS['comment'], timestamp, now)
+
+    db.session.execute(sa.delete(PostScore))
+    if scores:
+        db.session.execute(sa.insert(PostScore), [{'post_id': post_id, 'score': score} for post_id, score in scores.items()])
+    db.session.commit()
+    logger.info(f"Rebuilt hot scores for {len(scores)} posts")
+    return len(scores)
+
+
+def start_renormalizer(app, interval):
+    def run():
+        # The first pass comes soon after startup, in case the epoch aged while
+        # nothing was running.
+        time.sleep(min(interval, 60))
+        while True:
+            with app.app_context():
+                try:
+                    renormalize()
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Hot score renormalization failed: {str(e)}")
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name='hot-renormalizer', daemon=True)
+    thread.start()
+    return thread
+
+
+def init_ranking(app):
+    @app.cli.command('renormalize-hot')
+    def renormalize_hot_command():
+        """Rescale hot scores to a new epoch and prune decayed posts."""
+        renormalize()
+
+    @app.cli.command('rebuild-hot')
+    def rebuild_hot_command():
+        """Recompute hot scores for every post from scratch."""
+        rebuild()
+
+    interval = app.config.get('HOT_RENORMALIZE_INTERVAL')
+    if interval:
+        start_renormalizer(app, interval)
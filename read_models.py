@@ -0,0 +1,137 @@
+"""Read-only projections of posts for list views.
+
+List pages only show a handful of fields, so instead of hydrating ``Post``
+instances (with their base64 ``image_url`` payload and identity-map
+bookkeeping) they select just those columns into small ``__slots__`` records.
+The image itself is served separately by ``views.post_image``; a row only
+carries ``has_image``. Categories and comments are fetched once per partition
+of ``batch_size`` rows with an ``IN`` query rather than per post.
+
+Posts live in two sets of tables, hot and archive (see archive.py). Every
+helper takes the ``tables`` to read; ``iter_all_post_rows`` walks hot then
+archive, which is newest-first overall because archived posts are all older.
+"""
+from collections import defaultdict, namedtuple
+from itertools import chain
+
+import sqlalchemy as sa
+
+from models import (db, User, Post, Comment, Category, post_categories,
+                    ArchivedPost, ArchivedComment, archived_post_categories)
+
+PostTables = namedtuple('PostTables', 'post comment post_categories')
+HOT = PostTables(Post, Comment, post_categories)
+ARCHIVE = PostTables(ArchivedPost, ArchivedComment, archived_post_categories)
+
+AuthorRow = namedtuple('AuthorRow', 'id username')
+CategoryRow = namedtuple('CategoryRow', 'id name')
+
+
+class CommentRow:
+    __slots__ = ('content', 'timestamp', 'author')
+
+    def __init__(self, content, timestamp, author):
+        self.content = content
+        self.timestamp = timestamp
+        self.author = author
+
+
+class PostRow:
+    __slots__ = ('id', 'content', 'timestamp', 'has_image', 'author', 'categories', 'comments')
+
+    def __init__(self, id, content, timestamp, has_image, author):
+        self.id = id
+        self.content = content
+        self.timestamp = timestamp
+        self.has_image = has_image
+        self.author = author
+        self.categories = ()
+        self.comments = ()
+
+
+def post_rows_query(tables=HOT):
+    """The columns a ``PostRow`` is built from; callers add filters, order and limits."""
+    post = tables.post
+    return (sa.select(post.id, post.content, post.timestamp,
+                      post.image_url.is_not(None).label('has_image'),
+                      User.id.label('author_id'), User.username)
+            .join(User, User.id == post.user_id))
+
+
+def _categories_by_post(tables, post_ids):
+    links = tables.post_categories
+    rows = db.session.execute(
+        sa.select(links.c.post_id, Category.id, Category.name)
+        .join(Category, Category.id == links.c.category_id)
+        .where(links.c.post_id.in_(post_ids))
+        .order_by(Category.name))
+    grouped = defaultdict(list)
+    for post_id, category_id, name in rows:
+        grouped[post_id].append(CategoryRow(category_id, name))
+    return grouped
+
+
+def _comments_by_post(tables, post_ids):
+    comment = tables.comment
+    rows = db.session.execute(
+        sa.select(comment.post_id, comment.content, comment.timestamp, User.id, User.username)
+        .join(User, User.id == comment.user_id)
+        .where(comment.post_id.in_(post_ids))
+        .order_by(comment.timestamp, comment.id))
+    grouped = defaultdict(list)
+    for post_id, content, timestamp, user_id, username in rows:
+        grouped[post_id].append(CommentRow(content, timestamp, AuthorRow(user_id, username)))
+    return grouped
+
+
+def _to_rows(partition, categories, comments, tables):
+    posts = [PostRow(id, content, timestamp, has_image, AuthorRow(author_id, username))
+             for id, content, timestamp, has_image, author_id, username in partition]
+    post_ids = [post.id for post in posts]
+    if categories and post_ids:
+        grouped = _categories_by_post(tables, post_ids)
+        for post in posts:
+            post.categories = grouped.get(post.id, ())
+    if comments and post_ids:
+        grouped = _comments_by_post(tables, post_ids)
+        for post in posts:
+            post.comments = grouped.get(post.id, ())
+    return posts
+
+
+def iter_post_rows(query, categories=True, comments=False, batch_size=100, tables=HOT):
+    """Yield ``PostRow``s for ``query`` (built on ``post_rows_query(tables)``), ``batch_size`` at a time."""
+    result = db.session.execute(query.execution_options(yield_per=batch_size))
+    for partition in result.partitions():
+        yield from _to_rows(partition, categories, comments, tables)
+
+
+def post_rows(query, categories=True, comments=False, tables=HOT):
+    """Like ``iter_post_rows`` but for short, bounded queries: returns a list."""
+    return _to_rows(db.session.execute(query).all(), categories, comments, tables)
+
+
+def needs_archive(since=None):
+    """Whether rows newer than ``since`` (None: any age) can be in the archive.
+
+    The archive job moves everything older than its cutoff, so every archived
+    post predates the oldest hot post.
+    """
+    if since is None:
+        return True
+    hot_floor = db.session.scalar(sa.select(sa.func.min(Post.timestamp)))
+    return hot_floor is None or since < hot_floor
+
+
+def iter_all_post_rows(build, since=None, **kwargs):
+    """Newest-first ``PostRow``s from the hot tables, then the archive.
+
+    ``build(tables)`` returns the query for one set of tables, ordered newest
+    first. The archive query only runs once the hot rows are used up, and not at
+    all when ``since`` shows everything wanted is still hot.
+    """
+    def archived():
+        if needs_archive(since):
+            yield from iter_post_rows(build(ARCHIVE), tables=ARCHIVE, **kwargs)
+
+    return chain(iter_post_rows(build(HOT), tables=HOT, **kwargs), archived())
@@ -0,0 +1,168 @@
+"""Batch "who to follow" recommendations from the follow graph.
+
+The ``followers`` edges are loaded into a sparse adjacency matrix ``A``
+(``A[u, v] = 1`` when u follows v). Row u of ``A @ A`` counts, for every user
+y, how many of the people u follows also follow y. Those second-degree counts,
+minus u itself and anyone u already follows, are u's candidates; the top
+RECOMMENDATIONS_PER_USER by count (ties broken towards more-followed users)
+go into ``follow_recommendation``.
+
+Runs are incremental: following or unfollowing marks the actor in
+``recommendation_dirty``, and only they and the users who follow them (whose
+second-degree neighbourhood changed with them) are recomputed. Their counts
+are then exact; only the popularity tie-break of untouched users can lag,
+which an occasional ``--full`` run refreshes. NumPy and SciPy are imported only by the job, so web
+workers don't load them.
+"""
+import logging
+import threading
+import time
+from datetime import datetime
+
+import click
+import sqlalchemy as sa
+
+from models import db, User, FollowRecommendation, RecommendationDirty, followers
+
+logger = logging.getLogger(__name__)
+
+RECOMMENDATIONS_PER_USER = 10
+CHUNK_SIZE = 2000
+
+
+def load_adjacency():
+    import numpy as np
+    from scipy import sparse
+
+    edges = db.session.execute(sa.select(followers.c.follower_id, followers.c.followed_id)).all()
+    size = (db.session.scalar(sa.select(sa.func.max(User.id))) or 0) + 1
+    if edges:
+        rows, cols = np.array(edges, dtype=np.int64).T
+    else:
+        rows = cols = np.empty(0, dtype=np.int64)
+    adjacency = sparse.csr_matrix((np.ones(len(rows), dtype=np.int32), (rows, cols)), shape=(size, size))
+    # Duplicate edges would count twice; the table has no unique constraint.
+    adjacency.data[:] = 1
+    return adjacency
+
+
+def top_k(adjacency, users, k, popularity):
+    """``{user: [(recommended, mutual_count, score), ...]}`` for ``users``."""
+    import numpy as np
+
+    followed = adjacency[users]
+    second_degree = (followed @ adjacency).tocsr()
+    results = {}
+    for row, user in enumerate(users):
+        start, end = second_degree.indptr[row], second_degree.indptr[row + 1]
+        candidates = second_degree.indices[start:end]
+        counts = second_degree.data[start:end]
+        keep = (candidates != user) & ~np.isin(candidates, followed.indices[followed.indptr[row]:followed.indptr[row + 1]])
+        candidates, counts = candidates[keep], counts[keep]
+        if not len(candidates):
+            results[user] = []
+            continue
+        scores = counts + popularity[candidates]
+        if len(scores) > k:
+            best = np.argpartition(-scores, k - 1)[:k]
+        else:
+            best = np.arange(len(scores))
+        best = best[np.argsort(-scores[best], kind='stable')]
+        results[user] = [(int(candidates[i]), int(counts[i]), float(scores[i])) for i in best]
+    return results
+
+
+def affected_users(adjacency, dirty):
+    """The dirty users plus everyone who follows one of them."""
+    import numpy as np
+
+    dirty = np.array([user for user in dirty if user < adjacency.shape[0]], dtype=np.int64)
+    if not len(dirty):
+        return dirty
+    followers_of_dirty = adjacency.T.tocsr()[dirty].indices
+    return np.unique(np.concatenate([dirty, followers_of_dirty]))
+
+
+def compute_recommendations(full=False, k=RECOMMENDATIONS_PER_USER, chunk_size=CHUNK_SIZE):
+    """Recompute recommendations for changed users (or everyone); returns how many users."""
+    import numpy as np
+
+    started = datetime.utcnow()
+    dirty = db.session.scalars(sa.select(RecommendationDirty.user_id)
+                               .where(RecommendationDirty.marked_at <= started)).all()
+    if not full and not dirty:
+        return 0
+
+    adjacency = load_adjacency()
+    if full:
+        users = np.unique(adjacency.nonzero()[0])
+    else:
+        users = affected_users(adjacency, dirty)
+    in_degree = np.asarray(adjacency.sum(axis=0)).ravel()
+    # Scaled below 1 so it only breaks ties between equal mutual counts.
+    popularity = in_degree / (in_degree.max() + 1) if in_degree.size and in_degree.max() else np.zeros(adjacency.shape[0])
+
+    # End the read transaction before writing: on SQLite it would otherwise have
+    # to upgrade to the write lock, which fails if anyone wrote in the meantime.
+    db.session.commit()
+
+    recommendations = FollowRecommendation.__table__
+    for start in range(0, len(users), chunk_size):
+        chunk = users[start:start + chunk_size]
+        results = top_k(adjacency, chunk, k, popularity)
+        ids = [int(user) for user in chunk]
+        db.session.execute(sa.delete(recommendations).where(recommendations.c.user_id.in_(ids)))
+        rows = [{'user_id': int(user), 'recommended_id': recommended, 'mutual_count': mutual,
+                 'score': score, 'computed_at': started}
+                for user, picks in results.items() for recommended, mutual, score in picks]
+        if rows:
+            db.session.execute(sa.insert(recommendations), rows)
+        db.session.commit()
+
+    if full:
+        # Users who no longer follow anyone keep no stale suggestions.
+        db.session.execute(sa.delete(recommendations).where(recommendations.c.computed_at < started))
+    # Marks made while the job ran are left for the next run.
+    db.session.execute(sa.delete(RecommendationDirty.__table__).where(RecommendationDirty.marked_at <= started))
+    db.session.commit()
+    logger.info(f"Computed follow recommendations for {len(users)} users ({'full' if full else f'{len(dirty)} dirty'})")
+    return len(users)
+
+
+def recommendations_for(user_id, limit=RECOMMENDATIONS_PER_USER):
+    """Stored recommendations for ``user_id``, best first, as (User, mutual_count)."""
+    return db.session.execute(
+        sa.select(User, FollowRecommendation.mutual_count)
+        .join(FollowRecommendation, FollowRecommendation.recommended_id == User.id)
+        .where(FollowRecommendation.user_id == user_id)
+        .order_by(FollowRecommendation.score.desc())
+        .limit(limit)).all()
+
+
+def start_recommender(app, interval):
+    def run():
+        while True:
+            time.sleep(interval)
+            with app.app_context():
+                try:
+                    compute_recommendations(k=app.config.get('RECOMMENDATIONS_PER_USER', RECOMMENDATIONS_PER_USER))
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Computing follow recommendations failed: {str(e)}")
+
+    thread = threading.Thread(target=run, name='follow-recommender', daemon=True)
+    thread.start()
+    return thread
+
+
+def init_recommendations(app):
+    @app.cli.command('recommend-follows')
+    @click.option('--full', is_flag=True, help='Recompute every user, not just changed neighbourhoods.')
+    def recommend_follows_command(full):
+        """Compute "who to follow" recommendations from the follow graph."""
+        count = compute_recommendations(full=full, k=app.config.get('RECOMMENDATIONS_PER_USER', RECOMMENDATIONS_PER_USER))
+        print(f'Updated recommendations for {count} users')
+
+    interval = app.config.get('RECOMMENDATIONS_INTERVAL')
+    if interval:
+        start_recommender(app, interval)
@@ -0,0 +1,167 @@
+"""Session signing keys and the optional server-side session store.
+
+Every worker must sign cookies with the same key, so SECRET_KEY comes from the
+environment. To rotate it, move the old key into SECRET_KEY_FALLBACKS: cookies
+signed with a fallback are still accepted (Flask 3.1 checks the fallbacks
+itself) and are re-signed with the current key on their next write.
+
+With SESSION_BACKEND=filesystem the cookie holds only a signed session id and
+the data lives in SESSION_FILE_DIR, shared by every worker on the host. That
+keeps cookies small and lets sessions be revoked by deleting their file.
+"""
+import logging
+import os
+import secrets
+import tempfile
+import time
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SecureCookieSessionInterface, SessionMixin
+from itsdangerous import BadSignature
+from werkzeug.datastructures import CallbackDict
+
+logger = logging.getLogger(__name__)
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+
+
+class FilesystemSessionStore:
+    """One file per session id; writes go through a temp file and ``os.replace``."""
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, sid):
+        return os.path.join(self.directory, sid)
+
+    def load(self, sid, max_age):
+        path = self._path(sid)
+        try:
+            if time.time() - os.path.getmtime(path) > max_age:
+                self.delete(sid)
+                return None
+            with open(path, encoding='utf-8') as f:
+                return self.serializer.loads(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def save(self, sid, data):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(self.serializer.dumps(data))
+        os.replace(tmp, self._path(sid))
+
+    def delete(self, sid):
+        try:
+            os.remove(self._path(sid))
+        except FileNotFoundError:
+            pass
+
+    def purge(self, max_age):
+        """Remove sessions idle for longer than ``max_age`` seconds; returns how many."""
+        removed = 0
+        cutoff = time.time() - max_age
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                self.delete(entry.name)
+                removed += 1
+        return removed
+
+
+class ServerSideSessionInterface(SecureCookieSessionInterface):
+    """Keeps session data in ``store``; the cookie carries a signed session id.
+
+    Signing reuses Flask's serializer, so SECRET_KEY_FALLBACKS apply here too.
+    """
+    salt = 'server-side-session'
+
+    def __init__(self, store):
+        self.store = store
+
+    def _max_age(self, app):
+        return int(app.permanent_session_lifetime.total_seconds())
+
+    def open_session(self, app, request):
+        serializer = self.get_signing_serializer(app)
+        if serializer is None:
+            return None
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = serializer.loads(cookie, max_age=self._max_age(app))
+            except BadSignature:
+                sid = None
+            if sid:
+                data = self.store.load(sid, self._max_age(app))
+                if data is not None:
+                    return ServerSideSession(data, sid=sid)
+        return ServerSideSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path, secure=self.get_cookie_secure(app),
+                                       partitioned=self.get_cookie_partitioned(app),
+                                       httponly=self.get_cookie_httponly(app),
+                                       samesite=self.get_cookie_samesite(app))
+                response.vary.add('Cookie')
+            return
+
+        if not self.should_set_cookie(app, session):
+            return
+
+        self.store.save(session.sid, dict(session))
+        response.set_cookie(
+            name,
+            self.get_signing_serializer(app).dumps(session.sid),
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            partitioned=self.get_cookie_partitioned(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+        response.vary.add('Cookie')
+
+
+def init_sessions(app):
+    if not app.config.get('SECRET_KEY'):
+        # Fine for a single development process; with several workers each one
+        # would sign with its own key and logins would not survive a hop.
+        logger.warning('SECRET_KEY is not set; using a random per-process key')
+        app.config['SECRET_KEY'] = os.urandom(32)
+
+    backend = app.config.get('SESSION_BACKEND', 'cookie')
+    if backend == 'filesystem':
+        store = FilesystemSessionStore(app.config.get('SESSION_FILE_DIR')
+                                       or os.path.join(app.instance_path, 'sessions'))
+        app.session_interface = ServerSideSessionInterface(store)
+
+        @app.cli.command('purge-sessions')
+        def purge_sessions_command():
+            """Delete server-side sessions older than PERMANENT_SESSION_LIFETIME."""
+            removed = store.purge(app.permanent_session_lifetime.total_seconds())
+            print(f'Removed {removed} expired sessions')
+    elif backend != 'cookie':
+        raise ValueError(f'Unknown SESSION_BACKEND: {backend!r}')
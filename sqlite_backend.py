@@ -0,0 +1,286 @@
+"""Single-node SQLite profile.
+
+With a ``sqlite:///path`` DATABASE_URL every pooled connection is put in WAL
+mode, so the feed's readers keep reading while a write commits, and gets the
+SQLITE_SYNCHRONOUS, SQLITE_CACHE_SIZE_KB, SQLITE_MMAP_SIZE and
+SQLITE_BUSY_TIMEOUT_MS pragmas.
+
+SQLite has one write lock. A transaction that starts deferred, reads, and then
+tries to write fails at once with "database is locked" if another writer
+committed in between; busy_timeout does not help it. So BEGIN is held back
+until a transaction's first statement, and a transaction that will write
+starts with ``BEGIN IMMEDIATE``, taking the lock up front: the ORM session of
+any request that is not GET/HEAD/OPTIONS, and any transaction whose first
+statement writes or is a ``SELECT ... FOR UPDATE``. In this process those queue
+for the lock in arrival order on a ``WriterQueue`` instead of polling SQLite;
+writers in other processes are queued by busy_timeout. Everything else (GET
+requests, warm-up and health checks, read-only jobs) reads without queueing.
+A job outside a request that reads and only then writes takes the lock at its
+first write, and may still get "database is locked"; it should start with the
+write, with ``FOR UPDATE``, or commit its reads first.
+
+When the SQLite build has FTS5 with the trigram tokenizer, ``post_fts`` and
+``archived_post_fts`` index post content (kept in sync by triggers), and
+``search_filter`` runs the same ``LIKE '%query%'`` substring match through
+them instead of scanning the post table.
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+import click
+import sqlalchemy as sa
+from flask import current_app, has_request_context, request
+
+from db_routing import READ_ONLY_METHODS, RoutingSession
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLES = {'post': 'post_fts', 'archived_post': 'archived_post_fts'}
+READ_STATEMENTS = ('SELECT', 'PRAGMA', 'EXPLAIN', 'VALUES')
+
+
+class WriterQueue:
+    """A lock that hands itself to waiting threads in the order they arrived."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters = deque()
+        self._held = False
+        self._owner = None
+
+    def acquire(self, timeout=None):
+        with self._lock:
+            if not self._held:
+                self._held = True
+                self._owner = threading.get_ident()
+                return True
+            waiter = threading.Lock()
+            waiter.acquire()
+            self._waiters.append(waiter)
+        if not waiter.acquire(timeout=-1 if timeout is None else timeout):
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    return False
+            # Handed over just as we gave up; we own it after all.
+        self._owner = threading.get_ident()
+        return True
+
+    def release(self):
+        with self._lock:
+            self._owner = None
+            if self._waiters:
+                self._waiters.popleft().release()  # still held, now by the waiter
+            else:
+                self._held = False
+
+    def held_by_current_thread(self):
+        return self._owner == threading.get_ident()
+
+
+def is_file_database(url):
+    url = sa.engine.make_url(url)
+    return (url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+            and url.query.get('mode') != 'memory')
+
+
+def _pragmas(config):
+    return [
+        ('journal_mode', 'WAL'),
+        ('synchronous', config.get('SQLITE_SYNCHRONOUS', 'NORMAL')),
+        ('cache_size', -int(config.get('SQLITE_CACHE_SIZE_KB', 65536))),  # negative: KiB, not pages
+        ('mmap_size', int(config.get('SQLITE_MMAP_SIZE', 256 * 2**20))),
+        ('busy_timeout', int(config.get('SQLITE_BUSY_TIMEOUT_MS', 5000))),
+        ('temp_store', 'MEMORY'),
+    ]
+
+
+def _is_write(statement, context):
+    compiled = context.compiled if context is not None else None
+    if compiled is not None and not context.is_text:
+        return (context.isinsert or context.isupdate or context.isdelete or context.isddl
+                # SQLite drops FOR UPDATE, but it says the transaction means to write.
+                or getattr(compiled.statement, '_for_update_arg', None) is not None)
+    words = statement.split(None, 1)
+    return not words or words[0].upper() not in READ_STATEMENTS
+
+
+def _install(engine, pragmas, writers, timeout):
+    def connect(dbapi_connection, connection_record):
+        # BEGIN is issued by the listeners below, instead of the driver.
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas:
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+
+    def begin(connection):
+        # Deferred to the first statement, which shows whether the transaction writes.
+        connection.info['sqlite_begin'] = True
+
+    def take_lock(connection):
+        start = time.monotonic()
+        if not writers.acquire(timeout):
+            raise TimeoutError(f"Waited {timeout}s for the SQLite write lock")
+        connection.info['sqlite_writer'] = True
+        waited = time.monotonic() - start
+        if waited > 1:
+            logger.warning(f"Waited {waited:.1f}s for the SQLite write lock")
+
+    def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        if connection.info.pop('sqlite_begin', False):
+            if not (connection.info.pop('sqlite_session_writes', False) or _is_write(statement, context)):
+                cursor.execute('BEGIN')
+                return
+            take_lock(connection)
+            try:
+                cursor.execute('BEGIN IMMEDIATE')
+            except Exception:
+                end(connection)
+                raise
+        elif not connection.info.get('sqlite_writer') and _is_write(statement, context):
+            # A read transaction that now writes: line up behind this process's writers.
+            take_lock(connection)
+
+    def end(connection):
+        connection.info.pop('sqlite_begin', None)
+        connection.info.pop('sqlite_session_writes', None)
+        if connection.info.pop('sqlite_writer', False):
+            writers.release()
+
+    def checkin(dbapi_connection, connection_record):
+        # A connection returned mid-transaction is rolled back by the pool.
+        connection_record.info.pop('sqlite_begin', None)
+        connection_record.info.pop('sqlite_session_writes', None)
+        if connection_record.info.pop('sqlite_writer', False):
+            writers.release()
+
+    sa.event.listen(engine, 'connect', connect)
+    sa.event.listen(engine, 'begin', begin)
+    sa.event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    sa.event.listen(engine, 'commit', end)
+    sa.event.listen(engine, 'rollback', end)
+    sa.event.listen(engine, 'checkin', checkin)
+
+
+@sa.event.listens_for(RoutingSession, 'after_begin')
+def _mark_writing_session(session, transaction, connection):
+    # Runs before the session's first statement, while BEGIN is still held back.
+    if 'sqlite_begin' in connection.info and has_request_context() and request.method not in READ_ONLY_METHODS:
+        connection.info['sqlite_session_writes'] = True
+
+
+def fts5_available(connection):
+    """Whether this SQLite has FTS5 with the trigram tokenizer (3.34+)."""
+    try:
+        connection.exec_driver_sql("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x, tokenize='trigram')")
+    except sa.exc.OperationalError:
+        return False
+    connection.exec_driver_sql('DROP TABLE temp.fts5_probe')
+    return True
+
+
+def _fts_triggers(table, fts):
+    return {
+        f'{fts}_insert': f"CREATE TRIGGER {fts}_insert AFTER INSERT ON {table} BEGIN "
+                         f"INSERT INTO {fts}(rowid, content) VALUES (new.id, new.content); END",
+        f'{fts}_delete': f"CREATE TRIGGER {fts}_delete AFTER DELETE ON {table} BEGIN "
+                         f"INSERT INTO {fts}({fts}, rowid, content) VALUES ('delete', old.id, old.content); END",
+        f'{fts}_update': f"CREATE TRIGGER {fts}_update AFTER UPDATE OF content ON {table} BEGIN "
+                         f"INSERT INTO {fts}({fts}, rowid, content) VALUES ('delete', old.id, old.content); "
+                         f"INSERT INTO {fts}(rowid, content) VALUES (new.id, new.content); END",
+    }
+
+
+def ensure_search_index(connection, rebuild=False):
+    """Create the FTS5 indexes for whichever post tables exist; returns their names.
+
+    Triggers go with their table when a migration recreates it, so missing ones
+    are put back and the index rebuilt. An index built with another tokenizer
+    (word matching, before search kept LIKE's substring semantics) is replaced.
+    """
+    inspector = sa.inspect(connection)
+    created = []
+    for table, fts in FTS_TABLES.items():
+        if not inspector.has_table(table):
+            continue
+        stale = rebuild
+        definition = connection.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (fts,)).scalar()
+        if definition is not None and 'trigram' not in definition:
+            connection.exec_driver_sql(f'DROP TABLE {fts}')
+            definition = None
+        if definition is None:
+            connection.exec_driver_sql(f"CREATE VIRTUAL TABLE {fts} USING fts5("
+                                       f"content, content='{table}', content_rowid='id', tokenize='trigram')")
+            stale = True
+        existing = set(connection.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = ?", (table,)).scalars())
+        for name, statement in _fts_triggers(table, fts).items():
+            if name not in existing:
+                connection.exec_driver_sql(statement)
+                stale = True
+        if stale:
+            connection.exec_driver_sql(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+        created.append(fts)
+    return created
+
+
+def search_filter(model, query):
+    """A WHERE clause matching ``model`` rows whose content contains ``query``, ignoring case.
+
+    Uses the FTS5 trigram index when there is one (queries of three or more
+    characters are answered from it), otherwise a LIKE scan.
+    """
+    fts = FTS_TABLES.get(model.__tablename__)
+    if fts and fts in current_app.extensions.get('sqlite_fts', ()):
+        index = sa.table(fts, sa.column('rowid'), sa.column('content'))
+        # SQLite's LIKE already ignores ASCII case, and the index only serves a plain LIKE.
+        return model.id.in_(sa.select(index.c.rowid).where(index.c.content.like(f'%{query}%')))
+    return model.content.ilike(f'%{query}%')
+
+
+def holds_write_lock():
+    """Whether this thread holds the SQLite write lock (always False on other databases)."""
+    writers = current_app.extensions.get('sqlite_writer')
+    return writers is not None and writers.held_by_current_thread()
+
+
+def init_sqlite(app, db):
+    """Apply the SQLite profile when the app's database is a SQLite file."""
+    app.extensions['sqlite_fts'] = ()
+    if not (app.config.get('SQLITE_TUNING', True) and app.config.get('SQLALCHEMY_DATABASE_URI')
+            and is_file_database(app.config['SQLALCHEMY_DATABASE_URI'])):
+        return None
+
+    writers = app.extensions['sqlite_writer'] = WriterQueue()
+    with app.app_context():
+        engine = db.engine
+        _install(engine, _pragmas(app.config), writers,
+                 app.config.get('SQLITE_BUSY_TIMEOUT_MS', 5000) / 1000)
+
+        if app.config.get('SQLITE_FTS', True):
+            with engine.begin() as connection:
+                if fts5_available(connection):
+                    app.extensions['sqlite_fts'] = tuple(ensure_search_index(connection))
+                else:
+                    logger.info('SQLite was built without FTS5 trigram search; search falls back to LIKE')
+
+            @sa.event.listens_for(db.metadata, 'after_create')
+            def create_search_index(target, connection, **kw):
+                if connection.engine is engine and fts5_available(connection):
+                    app.extensions['sqlite_fts'] = tuple(ensure_search_index(connection))
+
+    @app.cli.command('rebuild-search-index')
+    def rebuild_search_index_command():
+        """Create or rebuild the FTS5 post search indexes."""
+        with db.engine.begin() as connection:
+            if not fts5_available(connection):
+                print('This SQLite build has no FTS5 trigram tokenizer')
+                return
+            print(f"Rebuilt {', '.join(ensure_search_index(connection, rebuild=True)) or 'no indexes'}")
+
+    logger.info(f"SQLite profile: WAL, single writer, FTS5 on {', '.join(app.extensions['sqlite_fts']) or 'nothing'}")
+    return writers
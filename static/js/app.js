@@ -0,0 +1,179 @@
+var socket = io();
+var visibleMessages = new Set();
+var pendingSubscribe = new Set();
+var pendingUnsubscribe = new Set();
+var flushTimer = null;
+
+// Subscribe to updates only for messages on screen, batching changes while scrolling.
+function flushSubscriptions() {
+    flushTimer = null;
+    if (pendingUnsubscribe.size) {
+        socket.emit('unsubscribe', {message_ids: Array.from(pendingUnsubscribe)});
+        pendingUnsubscribe.clear();
+    }
+    if (pendingSubscribe.size) {
+        socket.emit('subscribe', {message_ids: Array.from(pendingSubscribe)});
+        pendingSubscribe.clear();
+    }
+}
+
+function scheduleFlush() {
+    if (!flushTimer) {
+        flushTimer = setTimeout(flushSubscriptions, 200);
+    }
+}
+
+var messageObserver = new IntersectionObserver(function(entries) {
+    entries.forEach(function(entry) {
+        var messageId = Number(entry.target.dataset.messageId);
+        if (entry.isIntersecting && !visibleMessages.has(messageId)) {
+            visibleMessages.add(messageId);
+            pendingUnsubscribe.delete(messageId);
+            pendingSubscribe.add(messageId);
+        } else if (!entry.isIntersecting && visibleMessages.has(messageId)) {
+            visibleMessages.delete(messageId);
+            pendingSubscribe.delete(messageId);
+            pendingUnsubscribe.add(messageId);
+        }
+    });
+    scheduleFlush();
+}, {rootMargin: '200px 0px'});
+
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('.message[data-message-id]').forEach(function(element) {
+        messageObserver.observe(element);
+    });
+});
+
+// Events carry the outbox id they were stored under. The page starts at the
+// cursor it was rendered with; after every (re)connect the client asks for
+// what it missed, holding live events back until that answer has been applied.
+var lastEventId = Number(document.body.dataset.eventCursor || 0);
+var eventHandlers = {};
+var catchingUp = false;
+var heldEvents = [];
+
+function applyEvent(name, data) {
+    if (data.event_id) {
+        if (data.event_id <= lastEventId) {
+            return;
+        }
+        lastEventId = data.event_id;
+    }
+    eventHandlers[name](data);
+}
+
+function onEvent(name, handler) {
+    eventHandlers[name] = handler;
+    socket.on(name, function(data) {
+        if (catchingUp) {
+            heldEvents.push([name, data]);
+        } else {
+            applyEvent(name, data);
+        }
+    });
+}
+
+socket.on('connect', function() {
+    // Rooms do not survive a reconnect, so re-join everything still in view.
+    if (visibleMessages.size) {
+        socket.emit('subscribe', {message_ids: Array.from(visibleMessages)});
+    }
+    catchingUp = true;
+    socket.emit('catch_up', {after: lastEventId, message_ids: Array.from(visibleMessages)}, function(result) {
+        if (!result.complete) {
+            window.location.reload();
+            return;
+        }
+        result.events.forEach(function(event) {
+            if (eventHandlers[event.event]) {
+                applyEvent(event.event, event.data);
+            }
+        });
+        catchingUp = false;
+        heldEvents.splice(0).forEach(function(held) {
+            applyEvent(held[0], held[1]);
+        });
+    });
+});
+
+onEvent('new_message', function(message) {
+    console.log('New message received:', message);
+    var messagesContainer = document.querySelector('.container');
+    var newMessageElement = document.createElement('div');
+    newMessageElement.className = 'message';
+    newMessageElement.dataset.messageId = message.id;
+    newMessageElement.innerHTML = `
+        <div class="message-content">${message.content}</div>
+        ${message.image_url ? `<img src="${message.image_url}" alt="Dead Bee" class="dead-bee-image">` : ''}
+        <div class="message-meta">
+            <span class="avatar">${message.avatar}</span>
+            Posted by ${message.username} on ${message.timestamp}
+        </div>
+        <div class="reactions"></div>
+        <div class="comments-section"></div>
+        <form action="/post_comment/${message.id}" method="post">
+            <input type="text" name="content" placeholder="Add a comment" required>
+            <input type="submit" value="Post Comment">
+        </form>
+    `;
+    messagesContainer.insertBefore(newMessageElement, messagesContainer.firstChild);
+    messageObserver.observe(newMessageElement);
+});
+
+onEvent('new_comment', function(comment) {
+    console.log('New comment received:', comment);
+    var messageElement = document.querySelector(`[data-message-id="${comment.message_id}"]`);
+    if (messageElement) {
+        var commentsSection = messageElement.querySelector('.comments-section');
+        if (!commentsSection) {
+            commentsSection = document.createElement('div');
+            commentsSection.className = 'comments-section';
+            messageElement.insertBefore(commentsSection, messageElement.querySelector('form'));
+        }
+        var newCommentElement = document.createElement('div');
+        newCommentElement.className = 'comment';
+        newCommentElement.innerHTML = `
+            <div class="comment-content">${comment.content}</div>
+            <div class="comment-meta">
+                <span class="avatar">${comment.avatar}</span>
+                Posted by ${comment.username} on ${comment.timestamp}
+            </div>
+        `;
+        commentsSection.appendChild(newCommentElement);
+    }
+});
+
+onEvent('image_update', function(data) {
+    // The provider's image has replaced the procedural stand-in.
+    var messageElement = document.querySelector(`[data-message-id="${data.message_id}"]`);
+    var image = messageElement && messageElement.querySelector('.dead-bee-image');
+    if (image) {
+        image.src = `/message/${data.message_id}/image?v=${Date.now()}`;
+    }
+});
+
+onEvent('reaction_update', function(data) {
+    console.log('Reaction update received:', data);
+    var messageElement = document.querySelector(`[data-message-id="${data.message_id}"]`);
+    if (messageElement) {
+        var reactionsElement = messageElement.querySelector('.reactions');
+        if (reactionsElement) {
+            reactionsElement.innerHTML = '';
+            for (var reaction in data.reactions) {
+                reactionsElement.innerHTML += `<button onclick="addReaction(${data.message_id}, '${reaction}')">${reaction} ${data.reactions[reaction]}</button>`;
+            }
+        }
+    }
+});
+
+function addReaction(messageId, reaction) {
+    console.log('Adding reaction:', messageId, reaction);
+    fetch(`/add_reaction/${messageId}/${reaction}`, {method: 'GET'})
+        .then(response => {
+            if (!response.ok) {
+                throw new Error('Network response was not ok');
+            }
+        })
+        .catch(error => console.error('Error:', error));
+}
@@ -50,4 +50,105 @@ document.addEventListener('DOMContentLoaded', function() {
             textarea.dispatchEvent(new Event('input'));
         }
     });
+
+    // Type-ahead suggestions for the search box. Typing only searches; a
+    // suggestion is followed when it is clicked, or highlighted and Enter pressed.
+    const searchInput = document.querySelector('input[data-autocomplete-url]');
+    if (searchInput) {
+        const list = document.getElementById(searchInput.getAttribute('aria-controls'));
+        let suggestions = [];
+        let highlighted = -1;
+        let timer = null;
+        let controller = null;
+
+        function close() {
+            clearTimeout(timer);
+            if (controller) {
+                controller.abort();
+            }
+            suggestions = [];
+            highlighted = -1;
+            list.innerHTML = '';
+            list.hidden = true;
+            searchInput.setAttribute('aria-expanded', 'false');
+        }
+
+        function highlight(index) {
+            highlighted = index;
+            Array.from(list.children).forEach((item, i) => {
+                item.classList.toggle('highlighted', i === index);
+                item.setAttribute('aria-selected', i === index ? 'true' : 'false');
+            });
+        }
+
+        function show(results) {
+            suggestions = results;
+            highlighted = -1;
+            list.innerHTML = '';
+            results.forEach((result, index) => {
+                const item = document.createElement('li');
+                item.setAttribute('role', 'option');
+                item.dataset.index = index;
+                const label = document.createElement('span');
+                label.textContent = result.label;
+                const type = document.createElement('span');
+                type.className = 'suggestion-type';
+                type.textContent = result.type;
+                item.append(label, type);
+                list.appendChild(item);
+            });
+            list.hidden = results.length === 0;
+            searchInput.setAttribute('aria-expanded', results.length ? 'true' : 'false');
+        }
+
+        searchInput.addEventListener('input', function() {
+            const query = this.value.trim();
+            clearTimeout(timer);
+            if (!query) {
+                close();
+                return;
+            }
+            timer = setTimeout(function() {
+                if (controller) {
+                    controller.abort();
+                }
+                controller = new AbortController();
+                const url = `${searchInput.dataset.autocompleteUrl}?q=${encodeURIComponent(query)}`;
+                fetch(url, {signal: controller.signal})
+                    .then(response => response.json())
+                    .then(data => show(data.results))
+                    .catch(error => {
+                        if (error.name !== 'AbortError') {
+                            console.error('Autocomplete error:', error);
+                        }
+                    });
+            }, 120);
+        });
+
+        searchInput.addEventListener('keydown', function(event) {
+            if (event.key === 'ArrowDown' && suggestions.length) {
+                event.preventDefault();
+                highlight((highlighted + 1) % suggestions.length);
+            } else if (event.key === 'ArrowUp' && suggestions.length) {
+                event.preventDefault();
+                highlight(highlighted <= 0 ? suggestions.length - 1 : highlighted - 1);
+            } else if (event.key === 'Enter' && highlighted >= 0) {
+                event.preventDefault();
+                window.location.href = suggestions[highlighted].url;
+            } else if (event.key === 'Escape') {
+                close();
+            }
+        });
+
+        // mousedown rather than click: it lands before the input's blur closes the list.
+        list.addEventListener('mousedown', function(event) {
+            const item = event.target.closest('li');
+            if (item) {
+                event.preventDefault();
+                window.location.href = suggestions[Number(item.dataset.index)].url;
+            }
+        });
+
+        searchInput.addEventListener('blur', close);
+    }
 });
@@ -0,0 +1,77 @@
+"""Streamed, incrementally compressed HTML responses for long pages.
+
+``stream_page()`` renders with ``flask.stream_template`` so the header and the
+first posts go out while later rows are still being fetched. Jinja yields many
+tiny strings, so output is gathered into blocks of STREAM_BLOCK_SIZE characters;
+each block is compressed and sync-flushed, which keeps the client rendering
+progressively without giving up most of the compression ratio.
+"""
+import zlib
+
+from flask import Response, current_app, request, stream_template
+
+STREAM_BLOCK_SIZE = 8192
+
+
+def blocks(chunks, size):
+    buffer, buffered = [], 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        buffered += len(chunk)
+        if buffered >= size:
+            yield ''.join(buffer).encode('utf-8')
+            buffer, buffered = [], 0
+    if buffer:
+        yield ''.join(buffer).encode('utf-8')
+
+
+def gzip_stream(data):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for block in data:
+        yield compressor.compress(block) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush(zlib.Z_FINISH)
+
+
+def brotli_stream(data):
+    import brotli  # optional dependency, only negotiated when installed
+
+    compressor = brotli.Compressor(quality=5)
+    for block in data:
+        yield compressor.process(block) + compressor.flush()
+    yield compressor.finish()
+
+
+def _brotli_available():
+    try:
+        import brotli  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def negotiate_encoding():
+    accept = request.accept_encodings
+    if accept['br'] and _brotli_available():
+        return 'br'
+    if accept['gzip']:
+        return 'gzip'
+    return None
+
+
+def stream_page(template_name, **context):
+    """Stream ``template_name`` to the client, compressed with br/gzip when accepted."""
+    size = current_app.config.get('STREAM_BLOCK_SIZE', STREAM_BLOCK_SIZE)
+    data = blocks(stream_template(template_name, **context), size)
+    encoding = negotiate_encoding()
+    if encoding == 'br':
+        data = brotli_stream(data)
+    elif encoding == 'gzip':
+        data = gzip_stream(data)
+
+    response = Response(data, mimetype='text/html')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    # Tell buffering reverse proxies (nginx) to pass blocks through as they come.
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,14 +1,21 @@
 import os
-import requests
 import logging
 import base64
+from log_utils import configure_logging, Truncated
 
 # Set up logging
-logging.basicConfig(level=logging.DEBUG)
+configure_logging()
 logger = logging.getLogger(__name__)
 
+# Seconds before a Stability call is abandoned; a call that hangs would hold an
+# image worker (and the poster's admission slot) indefinitely.
+STABILITY_TIMEOUT = float(os.getenv('STABILITY_TIMEOUT', 60))
+STABILITY_CONNECTIVITY_TIMEOUT = 5
+
 def generate_dead_bee_image(prompt):
-    logger.debug(f"Generating dead bee image with prompt: {prompt}")
+    import requests  # deferred: only image generation needs the HTTP client
+
+    logger.debug("Generating dead bee image with prompt: %s", Truncated(prompt))
     api_key = os.getenv("STABILITY_API_KEY")
     logger.debug(f"API Key: {api_key[:5]}...{api_key[-5:]} (length: {len(api_key)})")
     if not api_key:
@@ -34,12 +41,13 @@ def generate_dead_bee_image(prompt):
         "samples": 1,
         "steps": 30,
     }
-    logger.debug(f"API Request Payload: {payload}")
+    logger.debug("API Request Payload: %s", Truncated(payload))
 
     try:
         # Test API connectivity
         try:
-            test_response = requests.get("https://api.stability.ai/v1/engines/list", headers=headers)
+            test_response = requests.get("https://api.stability.ai/v1/engines/list", headers=headers,
+                                         timeout=STABILITY_CONNECTIVITY_TIMEOUT)
             logger.debug(f"API Connectivity Test: {test_response.status_code}")
             if test_response.status_code == 401:
                 logger.error("API Key is invalid or expired")
@@ -48,21 +56,20 @@ def generate_dead_bee_image(prompt):
             logger.error(f"API Connectivity Test Failed: {str(e)}")
 
         logger.debug("Sending request to Stability AI API")
-        response = requests.post(url, headers=headers, json=payload)
+        response = requests.post(url, headers=headers, json=payload, timeout=STABILITY_TIMEOUT)
         logger.debug(f"API Response Status: {response.status_code}")
         logger.debug(f"API Response Headers: {response.headers}")
-        logger.debug(f"API Response Content: {response.text[:1000]}...")  # Log first 1000 characters
 
         response.raise_for_status()
         data = response.json()
-        logger.debug(f"API Response JSON: {data}")
+        logger.debug("API Response JSON: %s", Truncated(data))
 
         image_data = data["artifacts"][0]["base64"]
         logger.debug(f"Successfully generated image. Image data length: {len(image_data)}")
         return image_data, None
     except requests.exceptions.RequestException as e:
         logger.error(f"API Request Exception: {str(e)}")
-        logger.error(f"API Error Response: {e.response.text if e.response else 'No response'}")
+        logger.error("API Error Response: %s", Truncated(e.response.content) if e.response is not None else 'No response')
         return None, f"API error: {str(e)}"
     except KeyError as e:
         logger.error(f"KeyError while parsing API response: {str(e)}")
@@ -1,13 +1,9 @@
-from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import inspect
-from config import Config
-
-app = Flask(__name__)
-app.config.from_object(Config)
-db = SQLAlchemy(app)
+from main import create_app
+from models import db
 
 def verify_post_schema():
+    app = create_app()
     with app.app_context():
         inspector = inspect(db.engine)
         columns = inspector.get_columns('post')
@@ -0,0 +1,162 @@
+import base64
+
+from flask import current_app, render_template, redirect, url_for, flash, request, jsonify, abort, make_response
+from flask_login import login_user, current_user
+from models import db, User, Post, ArchivedPost, Category
+from forms import RegistrationForm, LoginForm, ProfileForm
+from autocomplete import get_index
+from ranking import hot_posts
+from profiles import get_profile_summary, parse_cursor, profile_posts_page
+from streaming import stream_page
+from read_models import iter_all_post_rows, post_rows_query
+from recommendations import recommendations_for
+from sqlite_backend import search_filter
+from feeds import external_url, feed_response, user_feed_query, category_feed_query
+
+# Imported on the first request routed here (see main.URL_RULES), so WTForms
+# and friends stay out of the cold-start path.
+
+def feed_batch_size():
+    return current_app.config.get('FEED_BATCH_SIZE', 100)
+
+def index():
+    posts = iter_all_post_rows(lambda tables: post_rows_query(tables).order_by(tables.post.timestamp.desc()),
+                               comments=True, batch_size=feed_batch_size())
+    return stream_page('index.html', posts=posts)
+
+def hot():
+    posts = hot_posts(current_app.config.get('HOT_PAGE_SIZE', 50))
+    return stream_page('index.html', posts=posts, heading='Trending Posts')
+
+def login():
+    if current_user.is_authenticated:
+        return redirect(url_for('index'))
+    form = LoginForm()
+    if form.validate_on_submit():
+        user = User.query.filter_by(username=form.username.data).first()
+        if user and user.check_password(form.password.data):
+            login_user(user)
+            flash('Logged in successfully.', 'success')
+            next_page = request.args.get('next')
+            return redirect(next_page or url_for('index'))
+        else:
+            flash('Invalid username or password', 'error')
+    return render_template('login.html', form=form)
+
+def register():
+    if current_user.is_authenticated:
+        return redirect(url_for('index'))
+    form = RegistrationForm()
+    if form.validate_on_submit():
+        user = User(username=form.username.data, email=form.email.data)
+        user.set_password(form.password.data)
+        db.session.add(user)
+        db.session.commit()
+        flash('Congratulations, you are now a registered user!', 'success')
+        return redirect(url_for('login'))
+    return render_template('register.html', title='Register', form=form)
+
+def profile(username):
+    user = User.query.filter_by(username=username).first_or_404()
+    form = ProfileForm()
+    if form.validate_on_submit() and current_user.is_authenticated and user == current_user:
+        user.avatar = form.avatar.data
+        user.bio = form.bio.data
+        db.session.commit()
+        flash('Your profile has been updated!', 'success')
+        return redirect(url_for('profile', username=username))
+    elif request.method == 'GET' and current_user.is_authenticated and user == current_user:
+        form.avatar.data = user.avatar
+        form.bio.data = user.bio
+    try:
+        cursor = parse_cursor(request.args.get('before'), request.args.get('before_id', type=int))
+    except ValueError:
+        abort(400, 'Invalid cursor')
+    posts, next_cursor = profile_posts_page(user.id, cursor, current_app.config.get('PROFILE_PAGE_SIZE', 20))
+    summary = get_profile_summary(user.id)
+    # The page is streamed after the session has closed, so lookups the template
+    # would lazily make are done here.
+    is_following = current_user.is_authenticated and user != current_user and current_user.is_following(user)
+    suggestions = []
+    if current_user.is_authenticated and user == current_user:
+        suggestions = recommendations_for(user.id, current_app.config.get('PROFILE_SUGGESTIONS', 5))
+    return stream_page('profile.html', user=user, form=form, posts=posts, summary=summary,
+                       next_cursor=next_cursor, is_following=is_following, suggestions=suggestions)
+
+def search():
+    query = request.args.get('query', '')
+    users = User.query.filter(User.username.ilike(f'%{query}%')).all()
+    posts = iter_all_post_rows(lambda tables: (post_rows_query(tables)
+                                               .where(search_filter(tables.post, query))
+                                               .order_by(tables.post.timestamp.desc())),
+                               batch_size=feed_batch_size())
+    categories = Category.query.filter(Category.name.ilike(f'%{query}%')).all()
+    return stream_page('search_results.html', query=query, users=users, posts=posts, categories=categories)
+
+def category_posts(category_id):
+    category = Category.query.get_or_404(category_id)
+    posts = iter_all_post_rows(lambda tables: (post_rows_query(tables)
+                                               .join(tables.post_categories,
+                                                     tables.post_categories.c.post_id == tables.post.id)
+                                               .where(tables.post_categories.c.category_id == category_id)
+                                               .order_by(tables.post.timestamp.desc())),
+                               categories=False, batch_size=feed_batch_size())
+    return stream_page('category_posts.html', category=category, posts=posts)
+
+def profile_feed(username):
+    user = User.query.filter_by(username=username).first_or_404()
+    return feed_response(('user', user.id), user_feed_query(user.id), f"{user.username} on Dead Bee Society",
+                         external_url('profile', username=user.username))
+
+def category_feed(category_id):
+    category = Category.query.get_or_404(category_id)
+    return feed_response(('category', category.id), category_feed_query(category.id),
+                         f"{category.name} on Dead Bee Society",
+                         external_url('category_posts', category_id=category.id))
+
+def post_image(post_id):
+    # List views only carry ``has_image``; the base64 payload is decoded here,
+    # once per browser thanks to the ETag and long max-age.
+    image = (db.session.scalar(db.select(Post.image_url).where(Post.id == post_id))
+             or db.session.scalar(db.select(ArchivedPost.image_url).where(ArchivedPost.id == post_id)))
+    if not image:
+        abort(404)
+    if image.startswith(('http://', 'https://')):
+        return redirect(image)
+    try:
+        data = base64.b64decode(image, validate=True)
+    except ValueError:
+        abort(404)
+    response = make_response(data)
+    response.mimetype = 'image/png'
+    response.add_etag()
+    response.cache_control.public = True
+    response.cache_control.max_age = 7 * 24 * 3600
+    return response.make_conditional(request)
+
+def who_to_follow():
+    if not current_user.is_authenticated:
+        return jsonify(error='login required'), 401
+    limit = min(request.args.get('limit', 10, type=int), 50)
+    results = [{'username': user.username, 'avatar': user.avatar, 'mutual_count': mutual_count,
+                'url': url_for('profile', username=user.username)}
+               for user, mutual_count in recommendations_for(current_user.id, limit)]
+    response = jsonify(results=results)
+    response.cache_control.private = True
+    response.cache_control.max_age = 300
+    return response
+
+def autocomplete():
+    query = request.args.get('q', '').strip()
+    limit = min(request.args.get('limit', 8, type=int), 25)
+    results = []
+    for kind, label, ref in get_index().search(query, limit):
+        if kind == 'user':
+            url = url_for('profile', username=ref)
+        else:
+            url = url_for('category_posts', category_id=ref)
+        results.append({'type': kind, 'label': label, 'url': url})
+    response = jsonify(results=results)
+    response.cache_control.public = True
+    response.cache_control.max_age = 30
+    return response